@@ -1,4 +0,0 @@
-#!/bin/bash
-
-ocm login --token="${OCM_TOKEN}"
-ocm token > ocm_token.txt
\ No newline at end of file
@@ -0,0 +1,41 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# connections kept per client, one pooled client is shared by every thread working on its (service, region)
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 32))
+# adaptive mode adds client side rate limiting on top of the exponential backoff of the standard mode
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 10))
+
+CLIENT_CONFIG = Config(max_pool_connections=MAX_POOL_CONNECTIONS,
+                       retries={'mode': 'adaptive', 'total_max_attempts': AWS_MAX_ATTEMPTS})
+
+# clients are thread safe once created, building them from a session is not
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+
+def get_session():
+    """Process wide boto3 session, resolves the endpoints and the credential chain only once"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.session.Session()
+        return _session
+
+
+def get_client(service:str, region_name:str=None):
+    """Pooled client for the given service and region, created on first use and shared by all the threads"""
+    key = (service, region_name)
+    client = _clients.get(key)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = session.client(service, region_name=region_name, config=CLIENT_CONFIG)
+                _clients[key] = client
+    return client
@@ -0,0 +1,65 @@
+"""
+Cluster listing and enrichment benchmark
+
+Times the OCM listing and creator enrichment paths against the local stand-in of ocm_stand_in.py for fleets of
+50, 500 and 5000 clusters, cold (empty creator cache) and warm (creators cached by the cold run).
+"""
+
+import argparse
+import time
+
+from creator_cache import creator_cache
+from ocm_client import ocm_client
+from ocm_stand_in import generate_fleet, start_stand_in
+from ocm_token import ocm_token_manager
+
+
+def timed(function, *args):
+    start = time.monotonic()
+    result = function(*args)
+    return result, time.monotonic() - start
+
+
+def benchmark(cluster_count:int, latency:float, creators:int):
+    server = start_stand_in(generate_fleet(cluster_count, creators), latency)
+    base_url = f'http://localhost:{server.server_port}'
+    try:
+        client = ocm_client('PROD', ocm_token_manager(offline_token='offline', token_url=f'{base_url}/token'), f'{base_url}/api')
+        clusters, list_time = timed(client.list_clusters)
+        cluster_ids = [cluster['id'] for cluster in clusters]
+        # in memory only, loading or saving would go to S3
+        cache = creator_cache('/dev/null')
+        server.requests = 0
+        details, cold_time = timed(client.get_cluster_creators, cluster_ids, cache)
+        cold_requests = server.requests
+        server.requests = 0
+        _, warm_time = timed(client.get_cluster_creators, cluster_ids, cache)
+        return {'clusters': len(clusters), 'enriched': len(details), 'list': list_time,
+                'cold': cold_time, 'cold_requests': cold_requests, 'warm': warm_time, 'warm_requests': server.requests}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Time OCM cluster listing and enrichment against the local stand-in')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000], help='fleet sizes to benchmark')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every stand-in response')
+    parser.add_argument('--creators', type=int, default=20, help='number of distinct cluster creators')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    print(f'latency {args.latency}s per request, {args.creators} creators')
+    print(f'{"clusters":>8} {"list":>8} {"enrich cold":>12} {"requests":>8} {"enrich warm":>12} {"requests":>8}')
+    for size in args.sizes:
+        result = benchmark(size, args.latency, args.creators)
+        if result['clusters'] != size or result['enriched'] != size:
+            print(f'listed {result["clusters"]} and enriched {result["enriched"]} of {size} clusters')
+        print(f'{size:>8} {result["list"]:>7.2f}s {result["cold"]:>11.2f}s {result["cold_requests"]:>8} '
+              f'{result["warm"]:>11.2f}s {result["warm_requests"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
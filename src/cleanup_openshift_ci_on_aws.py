@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import boto3
+from aws_clients import get_client
 import sys
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
@@ -9,8 +9,8 @@ import time
 class AWSResourceCleaner:
     def __init__(self, region: str = 'us-west-2'):
         self.region = region
-        self.ec2 = boto3.client('ec2', region_name=region)
-        self.iam = boto3.client('iam')
+        self.ec2 = get_client('ec2', region_name=region)
+        self.iam = get_client('iam')
         
     def get_expired_vpcs(self) -> List[Dict[str, Any]]:
         """Find VPCs with prow.k8s.io/build-id tag and expired expirationDate"""
@@ -201,7 +201,7 @@ class AWSResourceCleaner:
         """Delete all load balancers in the VPC"""
         try:
             # Classic Load Balancers
-            elb = boto3.client('elb', region_name=self.region)
+            elb = get_client('elb', region_name=self.region)
             response = elb.describe_load_balancers()
             
             for lb in response['LoadBalancerDescriptions']:
@@ -229,7 +229,7 @@ class AWSResourceCleaner:
                         print(f"  Warning: Could not get tags for classic load balancer {lb['LoadBalancerName']}: {tag_error}")
             
             # Application/Network Load Balancers
-            elbv2 = boto3.client('elbv2', region_name=self.region)
+            elbv2 = get_client('elbv2', region_name=self.region)
             response = elbv2.describe_load_balancers()
             
             for lb in response['LoadBalancers']:
@@ -686,7 +686,7 @@ def main():
     
     # Verify AWS credentials
     try:
-        sts = boto3.client('sts')
+        sts = get_client('sts')
         identity = sts.get_caller_identity()
         print(f"Running as: {identity.get('Arn', 'Unknown')}")
     except Exception as e:
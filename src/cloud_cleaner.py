@@ -1,57 +1,38 @@
 import json
 
-import boto3, os
+import os
+from aws_clients import get_client
+from ocm_client import get_clusters_for_accounts, get_ocm_client
 
 class oc_cluster:
     def __init__(self, cluster_detail, ocm_account):
-        details = cluster_detail.split(' ')
-        details = [detail for detail in details if detail]
-        self.id = details[0]
-        self.name = details[1]
-        self.api_url = details[2]
-        self.ocp_version = details[3]
-        self.type = details[4]
-        self.hcp = details[5]
-        self.cloud_provider = details[6]
-        self.region = details[7]
-        self.status = details[8]
+        self.id = cluster_detail['id']
+        self.name = cluster_detail['name']
+        self.api_url = cluster_detail.get('api', {}).get('url', '')
+        self.ocp_version = cluster_detail.get('openshift_version', '')
+        self.type = cluster_detail['product']['id']
+        self.hcp = 'true' if cluster_detail.get('hypershift', {}).get('enabled') else 'false'
+        self.cloud_provider = cluster_detail['cloud_provider']['id']
+        self.region = cluster_detail['region']['id']
+        self.status = cluster_detail['state']
         self.nodes = []
         self.ocm_account = ocm_account
 
 def get_all_cluster_details(ocm_account:str, clusters:list):
-    get_cluster_list(ocm_account)
-    clusters_details = open(f'clusters_{ocm_account}.txt').readlines()
-    for cluster_detail in clusters_details:
+    for cluster_detail in get_cluster_list(ocm_account):
         clusters.append(oc_cluster(cluster_detail, ocm_account))
     clusters = [cluster for cluster in clusters if cluster.cloud_provider == 'aws']
 
 def get_cluster_list(ocm_account:str):
-    run_command(f'script/./get_all_cluster_details.sh {ocm_account}')
+    return get_ocm_client(ocm_account).list_clusters()
 
 def run_command(command):
     output = os.popen(command).read()
     print(output)
     return output
 
-def get_instances_for_region(region, current_state):
-    ec2_client = boto3.client('ec2', region_name=region)
-    filters = [{'Name': 'instance-state-name', 'Values': [current_state]}]
-    ec2_map = ec2_client.describe_instances(Filters=filters, MaxResults=1000)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    # ec2_map = {list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))[0]['Value']: instance for instance in
-    #            ec2_map}
-    print(region, len(ec2_map))
-    return ec2_map
-
-def get_all_instances(ec2_instances, current_state):
-    client = boto3.client('ec2', region_name='us-east-1')
-    regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
-    for region in regions:
-        ec2_instances[region] = get_instances_for_region(region, current_state)
-
 def get_all_ebs_volumes(volumes, current_state):
-    client = boto3.client('ec2', region_name='us-east-1')
+    client = get_client('ec2', region_name='us-east-1')
     regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
     for region in regions:
         volumes[region] = get_ebs_volume_for_region(region, current_state)
@@ -66,7 +47,7 @@ def check_if_given_tag_exists(tag_name, volume):
                 break
     return result
 def get_ebs_volume_for_region(region, current_state):
-    ec2_client = boto3.client('ec2', region_name=region)
+    ec2_client = get_client('ec2', region_name=region)
     filters = [{'Name': 'status', 'Values': [current_state]}]
     volume_map = ec2_client.describe_volumes(Filters=filters, MaxResults=500)
     volume_map = [volume for volume in volume_map['Volumes'] if not check_if_given_tag_exists(
@@ -78,7 +59,7 @@ def get_ebs_volume_for_region(region, current_state):
 
 def cleanup_available_volumes(volumes:dict):
     for region, ebs_volumes in volumes.items():
-        ec2_client = boto3.client('ec2', region_name=region)
+        ec2_client = get_client('ec2', region_name=region)
         print(f'starting to clean volumes for region {region}')
         print('volumes to be deleted -', [volumeId for volumeId in ebs_volumes ])
         for volumeId in ebs_volumes:
@@ -86,20 +67,20 @@ def cleanup_available_volumes(volumes:dict):
             # ec2_client.delete_volume(VolumeId=volumeId)
 
 def get_all_elbs(elbs):
-    client = boto3.client('ec2', region_name='us-east-1')
+    client = get_client('ec2', region_name='us-east-1')
     regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
     for region in regions:
         elbs[region] = get_elbs_for_region(region)
 
 def get_elbs_for_region(region):
-    aws_client = boto3.client('elb', region_name=region)
+    aws_client = get_client('elb', region_name=region)
     all_elb_map = {}
     elb_map = aws_client.describe_load_balancers(PageSize=400)
     elb_map = [elb for elb in elb_map['LoadBalancerDescriptions']]
     print(region, len(elb_map))
     all_elb_map['nlb'] = elb_map
 
-    aws_client = boto3.client('elbv2', region_name=region)
+    aws_client = get_client('elbv2', region_name=region)
     elb_map = aws_client.describe_load_balancers(PageSize=400)
     elb_map = [elb for elb in elb_map['LoadBalancers']]
     print(region, len(elb_map))
@@ -108,7 +89,7 @@ def get_elbs_for_region(region):
     return all_elb_map
 
 def get_target_groups_health(LoadBalancerArn, region):
-    aws_client = boto3.client('elbv2', region_name=region)
+    aws_client = get_client('elbv2', region_name=region)
     target_groups = aws_client.describe_target_groups(LoadBalancerArn=LoadBalancerArn)
     healths = []
     for target_group in target_groups['TargetGroups']:
@@ -145,7 +126,7 @@ def elb_belongs_to_existing_cluster( cluster_names:list[str], tags:dict):
 
 def get_all_tags_for_nlbs(LoadBalancerNames:list, region):
     tags = {}
-    aws_client = boto3.client('elb', region_name=region)
+    aws_client = get_client('elb', region_name=region)
     chunk_size = 20
     start, end = 0, chunk_size if len(LoadBalancerNames) > chunk_size else len(LoadBalancerNames)
     while end <= len(LoadBalancerNames):
@@ -161,7 +142,7 @@ def get_all_tags_for_nlbs(LoadBalancerNames:list, region):
 
 def get_all_tags_for_albs(ResourceArns:list, region):
     tags = {}
-    aws_client = boto3.client('elbv2', region_name=region)
+    aws_client = get_client('elbv2', region_name=region)
     chunk_size = 20
     start, end = 0, chunk_size if len(ResourceArns) > chunk_size else len(ResourceArns)
     while end <= len(ResourceArns):
@@ -185,7 +166,7 @@ def cleanup_inactive_elbs(elbs:dict[dict], clusters:dict[oc_cluster]):
         print(f'starting to cleanup elbs for region {region}')
 
         print(f'starting with classic load balancers (nlb) for region {region}')
-        aws_client = boto3.client('elb', region_name=region)
+        aws_client = get_client('elb', region_name=region)
         nlb_tags = {}
         if elbs_for_region['nlb']:
             nlb_tags = get_all_tags_for_nlbs([nlb['LoadBalancerName'] for nlb in elbs_for_region['nlb']], region)
@@ -199,7 +180,7 @@ def cleanup_inactive_elbs(elbs:dict[dict], clusters:dict[oc_cluster]):
                 # print(f'Not cleaning up nlb {nlb["LoadBalancerName"]}, since it has instances attached')
 
         print(f'starting with application load balancers (alb) for region {region}')
-        aws_client = boto3.client('elbv2', region_name=region)
+        aws_client = get_client('elbv2', region_name=region)
         elb_tags = {}
         if elbs_for_region['alb']:
             elb_tags = get_all_tags_for_albs([alb['LoadBalancerArn'] for alb in elbs_for_region['alb']], region)
@@ -232,23 +213,20 @@ def cleanup_inactive_elbs(elbs:dict[dict], clusters:dict[oc_cluster]):
         print('elbs_to_be_deleted', len(elbs_to_be_deleted), json.dumps(elbs_to_be_deleted, indent=4))
 
 
-
-
-def cleanup_all_netoworking_data(ec2_running_instances:dict, ec2_stopped_instances:dict):
-    client = boto3.client('ec2', region_name='us-east-1')
-    regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
+def cleanup_all_netoworking_data(inventory:dict):
     associated_vpcs = []
-    for region in regions:
+    # regions which could not be scanned are not in the inventory, nothing is treated as orphaned there
+    for region, region_instances in inventory.items():
         print(f'starting with the region {region}')
-        ec2_client = boto3.client('ec2', region_name=region)
+        ec2_client = get_client('ec2', region_name=region)
 
         vpc_exceptions = ['vpc-00331e896a900165b'] #shared-rosa-hcp-vpc
-        associated_vpcs = list(set([instance['VpcId'] for instance in ec2_running_instances[region]] + [instance['VpcId'] for instance in ec2_stopped_instances[region]] + vpc_exceptions))
+        associated_vpcs = list(set(region_instances.vpcs) | set(vpc_exceptions))
         all_vpcs  =  ec2_client.describe_vpcs(MaxResults=500)
         all_vpcs = [vpc['VpcId'] for vpc in all_vpcs['Vpcs']]
         print('vpcs', len(all_vpcs), len(associated_vpcs))
 
-        associated_network_interfaces = list(set([interface['NetworkInterfaceId'] for instance in ec2_running_instances[region] for interface in instance['NetworkInterfaces']] + [interface['NetworkInterfaceId'] for instance in ec2_stopped_instances[region] for interface in instance['NetworkInterfaces']]))
+        associated_network_interfaces = list(set([interface_id for instance in region_instances.state('running', 'stopped') for interface_id in instance.network_interface_ids]))
         all_network_interfaces  =  ec2_client.describe_network_interfaces(MaxResults=500)
         all_network_interfaces = [network_interface['NetworkInterfaceId'] for network_interface in all_network_interfaces['NetworkInterfaces']]
         print('network_interfaces', len(all_network_interfaces), len(associated_network_interfaces))
@@ -276,23 +254,12 @@ def cleanup_all_netoworking_data(ec2_running_instances:dict, ec2_stopped_instanc
         print('elastic_ip_addresses', len(all_elastic_ip_addresses), len(associated_elastic_ip_addresses))
 
 
-
-
-
-
-
-
-
 def main():
     clusters = []
-    ocm_accounts = ['PROD', 'STAGE']
-    for ocm_account in ocm_accounts:
-        get_all_cluster_details(ocm_account, clusters)
-
-    # ec2_running_instances = {}
-    # get_all_instances(ec2_running_instances, 'running')
-    # ec2_stopped_instances = {}
-    # get_all_instances(ec2_stopped_instances, 'stopped')
+    get_clusters_for_accounts(get_all_cluster_details, clusters)
+
+    # inventory = {}
+    # get_inventory(inventory, ['running', 'stopped'])
     volumes = {}
     # get_all_ebs_volumes(volumes, 'available')
     # cleanup_available_volumes(volumes)
@@ -302,7 +269,7 @@ def main():
     cleanup_inactive_elbs(elbs, clusters)
     print(elbs)
 
-    # cleanup_all_netoworking_data(ec2_running_instances, ec2_stopped_instances)
+    # cleanup_all_netoworking_data(inventory)
 
 
 if __name__ == '__main__':
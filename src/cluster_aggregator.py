@@ -1,36 +1,33 @@
 import json
 import time
 
-import boto3
-import os
 import smartsheet
 import re
+from ec2_inventory import get_cluster_regions, get_inventory
+from ocm_client import get_clusters_for_accounts, get_ocm_client, update_cluster_details
 
 class oc_cluster:
     def __init__(self, cluster_detail, ocm_account):
-        details = cluster_detail.split(' ')
-        details = [detail for detail in details if detail]
-        self.id = details[0]
-        self.name = details[1]
-        self.internal_name = details[1]
-        self.api_url = details[2]
-        self.ocp_version = details[3]
-        self.type = details[4]
-        self.hcp = details[5]
-        self.cloud_provider = details[6]
-        self.region = details[7]
-        self.status = details[8]
+        self.id = cluster_detail['id']
+        self.name = cluster_detail['name']
+        self.internal_name = cluster_detail['name']
+        self.api_url = cluster_detail.get('api', {}).get('url', '')
+        self.ocp_version = cluster_detail.get('openshift_version', '')
+        self.type = cluster_detail['product']['id']
+        self.hcp = 'true' if cluster_detail.get('hypershift', {}).get('enabled') else 'false'
+        self.cloud_provider = cluster_detail['cloud_provider']['id']
+        self.region = cluster_detail['region']['id']
+        self.status = cluster_detail['state']
         self.nodes = []
         self.ocm_account = ocm_account
         self.creation_date = ''
         self.creator_name = ''
         self.creator_email = ''
 
-def get_ipi_cluster_name(cluster:oc_cluster):
+def get_ipi_cluster_name(cluster:oc_cluster, cluster_detail:dict):
     if cluster.name.count('-') == 4:
         try:
-            url = run_command(f'ocm describe cluster {cluster.id} | grep "Console URL:"')
-            url = url.replace('Console URL:', '').strip()
+            url = get_ocm_client(cluster.ocm_account).get_console_url(cluster_detail)
             result = re.search(r"^https:\/\/console-openshift-console.apps.(.*).ocp2.odhdev.com$", url)
             if result:
                 cluster.internal_name = result.group(1)
@@ -38,45 +35,18 @@ def get_ipi_cluster_name(cluster:oc_cluster):
             print(f'could not retrieve internal name for IPI cluster {cluster.name}, the cluster seems stale or non-existent')
 
 def get_all_cluster_details(ocm_account:str, clusters:list):
-    get_cluster_list(ocm_account)
-    clusters_details = open(f'clusters_{ocm_account}.txt').readlines()
-    for cluster_detail in clusters_details:
+    for cluster_detail in get_cluster_list(ocm_account):
         cluster = oc_cluster(cluster_detail, ocm_account)
         if cluster.type == 'ocp':
-            get_ipi_cluster_name(cluster)
+            get_ipi_cluster_name(cluster, cluster_detail)
         if cluster.cloud_provider == 'aws' and (
                 cluster.type != 'ocp' or (cluster.type == 'ocp' and cluster.name != cluster.internal_name)):
             clusters.append(cluster)
     # clusters = [cluster for cluster in clusters if cluster.cloud_provider == 'aws']
-    update_cluster_details(clusters)
-
-
-def update_cluster_details(clusters:list[oc_cluster]):
-    for cluster in clusters:
-        run_command(f'script/./get_cluster_details.sh {cluster.ocm_account} {cluster.id}')
-        details = json.load(open(f'{cluster.id}_details.json'))
-        cluster.creation_date = details['creation_date']
-        cluster.creator_name = details['creator_name']
-        if details['creator_email'] and details['creator_email'] != 'null':
-            cluster.creator_email = details['creator_email']
-            if '+' in cluster.creator_email:
-                cluster.creator_email = get_original_email_address(cluster.creator_email)
-
-
-def get_original_email_address(email:str):
-    parts = email.split('@')
-    original_prefix = parts[0].split('+')[0]
-    return f'{original_prefix}@{parts[1]}'
-
 
 
 def get_cluster_list(ocm_account:str):
-    run_command(f'script/./get_all_cluster_details.sh {ocm_account}')
-
-def run_command(command):
-    output = os.popen(command).read()
-    # print(output)
-    return output
+    return get_ocm_client(ocm_account).list_clusters()
 
 def build_cells(cluster: oc_cluster, column_map:dict):
     cells = []
@@ -214,49 +184,19 @@ def send_request_to_update_inactive_hours(row:smartsheet.smartsheet.models.row,
     # print(response)
 
 
-
-
-def get_instances_for_region(region, current_state):
-    ec2_client = boto3.client('ec2', region_name=region)
-    filters = [{'Name': 'instance-state-name', 'Values': [current_state]}]
-    ec2_map = ec2_client.describe_instances(Filters=filters, MaxResults=1000)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    ec2_map = {list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags'] if 'Tags' in instance else []))[0]['Value']: instance for instance in
-               ec2_map if list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags'] if 'Tags' in instance else []))}
-    print(region, len(ec2_map))
-    return ec2_map
-
-def get_all_instances(ec2_instances, current_state):
-    client = boto3.client('ec2', region_name='us-east-1')
-    regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
-    for region in regions:
-        ec2_instances[region] = get_instances_for_region(region, current_state)
-
-def worker_node_belongs_to_the_hcp_cluster(ec2_instance:dict, cluster_name:str):
-    """Check if an EC2 instance belongs to a specific HCP cluster """
-    result = False
-    for tag in ec2_instance['Tags']:
-        if tag['Key'] == 'api.openshift.com/name' and tag['Value'] == cluster_name:
-            result = True
-            break
-    return result
-
 def update_rosa_hosted_clusters_status(clusters:list[oc_cluster]):
-    ec2_instances = {}
-    get_all_instances(ec2_instances, 'running')
+    inventory = {}
+    failed_regions = get_inventory(inventory, ['running'], get_cluster_regions([cluster for cluster in clusters if cluster.type == 'rosa']))
     for cluster in clusters:
-        if cluster.type == 'rosa' and cluster.hcp == 'true':
-            worker_instances = [instance_name for instance_name in ec2_instances[cluster.region] if worker_node_belongs_to_the_hcp_cluster(ec2_instances[cluster.region][instance_name], cluster.name)]
+        if cluster.type == 'rosa' and cluster.hcp == 'true' and cluster.region not in failed_regions:
+            worker_instances = inventory[cluster.region].hcp_workers(cluster.name)
             if len(worker_instances) == 0:
                 cluster.status = 'hibernating'
 
 def main():
     clusters = []
-    ocm_accounts = ['PROD', 'STAGE']
-
-    for ocm_account in ocm_accounts:
-        get_all_cluster_details(ocm_account, clusters)
+    get_clusters_for_accounts(get_all_cluster_details, clusters)
+    update_cluster_details(clusters)
     update_rosa_hosted_clusters_status(clusters)
 
     names = [cluster.name for cluster in clusters]
@@ -264,7 +204,5 @@ def main():
     update_smartsheet_data(clusters)
 
 
-
-
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,60 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# clusters handled at the same time overall
+CLUSTER_MAX_WORKERS = int(os.environ.get('CLUSTER_MAX_WORKERS', 16))
+# clusters of the same region handled at the same time, keeps a busy region from being throttled by EC2
+CLUSTER_MAX_WORKERS_PER_REGION = int(os.environ.get('CLUSTER_MAX_WORKERS_PER_REGION', 4))
+# clusters of the same OCM account handled at the same time
+CLUSTER_MAX_WORKERS_PER_ACCOUNT = int(os.environ.get('CLUSTER_MAX_WORKERS_PER_ACCOUNT', 8))
+
+
+def run_for_clusters(task, clusters:list, max_workers:int=CLUSTER_MAX_WORKERS, max_per_region:int=CLUSTER_MAX_WORKERS_PER_REGION,
+                     max_per_account:int=CLUSTER_MAX_WORKERS_PER_ACCOUNT):
+    """Run task(cluster) for all the clusters in parallel within the global, per region and per OCM account limits.
+    Returns [(result, error)] in the order of clusters, a failing cluster does not stop the others"""
+    # a limit of 0 would leave every cluster pending forever
+    for limit, value in (('max_workers', max_workers), ('max_per_region', max_per_region), ('max_per_account', max_per_account)):
+        if value <= 0:
+            raise ValueError(f'{limit} must be positive, got {value}')
+    results = [(None, None)] * len(clusters)
+    pending = list(range(len(clusters)))
+    regions = Counter()
+    accounts = Counter()
+
+    def timed_task(cluster):
+        start = time.monotonic()
+        try:
+            return task(cluster), None, time.monotonic() - start
+        except Exception as e:
+            return None, e, time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        while pending or futures:
+            # clusters are started in order, one over the limit of its region or account leaves its place to the next ones
+            for index in list(pending):
+                if len(futures) >= max_workers:
+                    break
+                cluster = clusters[index]
+                if regions[cluster.region] >= max_per_region or accounts[cluster.ocm_account] >= max_per_account:
+                    continue
+                pending.remove(index)
+                regions[cluster.region] += 1
+                accounts[cluster.ocm_account] += 1
+                futures[executor.submit(timed_task, cluster)] = index
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.pop(future)
+                cluster = clusters[index]
+                regions[cluster.region] -= 1
+                accounts[cluster.ocm_account] -= 1
+                result, error, elapsed = future.result()
+                results[index] = (result, error)
+                if error is None:
+                    print(f'done with cluster {cluster.name} in {elapsed:.2f}s')
+                else:
+                    print(f'failed on cluster {cluster.name} after {elapsed:.2f}s: {error}')
+    return results
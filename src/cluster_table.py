@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+from s3_json_store import s3_json_store
+
+# every job keeps its own table, one job saving after another loaded would otherwise drop the deltas of the other.
+# Two runs of the same job can still overlap, the last one saved is a complete table as of its own start
+CLUSTER_TABLE_JOB = os.environ.get('CLUSTER_TABLE_JOB', os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'default')
+CLUSTER_TABLE_FILE = os.environ.get('CLUSTER_TABLE_FILE', 'cluster_table_{job}_{ocm_account}.json')
+CLUSTER_TABLE_KEY = 'Cloud-Cost-Optimization/Cluster-Table/{job}/cluster_table_{ocm_account}.json'
+# a full listing every so often catches whatever the deltas could not express
+CLUSTER_TABLE_FULL_SYNC_AGE = int(os.environ.get('CLUSTER_TABLE_FULL_SYNC_AGE', 6 * 3600))
+# consecutive delta windows overlap, covers the clock skew between the runner and OCM
+CLUSTER_TABLE_SYNC_OVERLAP = int(os.environ.get('CLUSTER_TABLE_SYNC_OVERLAP', 300))
+
+
+class cluster_table:
+    """Cluster records of an OCM account as of the last sync, persisted as JSON"""
+    def __init__(self, ocm_account:str, search:str):
+        self.ocm_account = ocm_account
+        self.search = search
+        self.store = s3_json_store(CLUSTER_TABLE_KEY.format(job=CLUSTER_TABLE_JOB, ocm_account=ocm_account),
+                                   CLUSTER_TABLE_FILE.format(job=CLUSTER_TABLE_JOB, ocm_account=ocm_account),
+                                   f'cluster table of {ocm_account}')
+        # cluster ID -> clusters_mgmt record
+        self.clusters = {}
+        self.synced_at = 0
+        self.full_synced_at = 0
+
+    def load(self):
+        table = self.store.load()
+        # a table listed with another search does not hold the same clusters
+        if table and table.get('search') == self.search:
+            self.clusters = table['clusters']
+            self.synced_at = table['synced_at']
+            self.full_synced_at = table['full_synced_at']
+
+    def save(self):
+        table = {'search': self.search, 'synced_at': self.synced_at, 'full_synced_at': self.full_synced_at, 'clusters': self.clusters}
+        self.store.save(table)
+
+    def needs_full_sync(self):
+        return time.time() - self.full_synced_at >= CLUSTER_TABLE_FULL_SYNC_AGE
@@ -0,0 +1,56 @@
+import os
+import time
+
+from s3_json_store import s3_json_store
+
+CREATOR_CACHE_FILE = os.environ.get('CREATOR_CACHE_FILE', 'creator_cache.json')
+# shared by all the jobs, the last one saved wins and the entries it lacks are only resolved again
+CREATOR_CACHE_KEY = 'Cloud-Cost-Optimization/Creator-Cache/creator_cache.json'
+CREATOR_CACHE_TTL = int(os.environ.get('CREATOR_CACHE_TTL', 7 * 24 * 3600))
+# accounts which could not be resolved are retried sooner than the resolved ones are refreshed
+CREATOR_CACHE_NEGATIVE_TTL = int(os.environ.get('CREATOR_CACHE_NEGATIVE_TTL', 24 * 3600))
+
+
+def get_original_email_address(email:str):
+    parts = email.split('@')
+    original_prefix = parts[0].split('+')[0]
+    return f'{original_prefix}@{parts[1]}'
+
+
+class creator_cache:
+    """OCM account ID -> creator name and normalized email, persisted as JSON with a TTL per entry"""
+    def __init__(self, path:str=CREATOR_CACHE_FILE):
+        self.store = s3_json_store(CREATOR_CACHE_KEY, path, 'creator cache')
+        self.entries = {}
+
+    def load(self):
+        self.entries = self.store.load() or {}
+        now = time.time()
+        self.entries = {key: entry for key, entry in self.entries.items() if now - entry['fetched_at'] < self.ttl(entry)}
+        print(f'loaded {len(self.entries)} creators from the cache')
+
+    def save(self):
+        self.store.save(self.entries, indent=4)
+
+    @staticmethod
+    def ttl(entry:dict):
+        return CREATOR_CACHE_NEGATIVE_TTL if entry.get('missing') else CREATOR_CACHE_TTL
+
+    def get(self, ocm_account:str, account_id:str):
+        """Fresh entry of the account, None when it has to be resolved again"""
+        entry = self.entries.get(f'{ocm_account}/{account_id}')
+        if entry and time.time() - entry['fetched_at'] < self.ttl(entry):
+            return entry
+        return None
+
+    def put(self, ocm_account:str, account_id:str, account:dict=None):
+        """Record a resolved account, or a missing one when account is None"""
+        if account is None:
+            entry = {'missing': True}
+        else:
+            email = account.get('email', '')
+            entry = {'name': f"{account.get('first_name', '')} {account.get('last_name', '')}".strip(),
+                     'email': get_original_email_address(email) if '+' in email else email}
+        entry['fetched_at'] = time.time()
+        self.entries[f'{ocm_account}/{account_id}'] = entry
+        return entry
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import WaiterError
+
+from aws_clients import get_client
+
+# volumes detached or deleted at the same time
+EBS_MAX_WORKERS = int(os.environ.get('EBS_MAX_WORKERS', 8))
+# the volume_available waiter checks every EBS_WAIT_DELAY seconds, EBS_WAIT_ATTEMPTS times at most
+EBS_WAIT_DELAY = int(os.environ.get('EBS_WAIT_DELAY', 5))
+EBS_WAIT_ATTEMPTS = int(os.environ.get('EBS_WAIT_ATTEMPTS', 60))
+# volume IDs or filter values sent in one DescribeVolumes call
+DESCRIBE_VOLUMES_BATCH = 200
+# set on the volumes provisioned by kubernetes, they hold data and are never retired
+KUBERNETES_CLUSTER_TAG = 'KubernetesCluster'
+
+
+def get_retirable_attachments(region, instance_ids:list):
+    """Attachments of the volumes of the given instances which are deleted on termination and were not provisioned by kubernetes"""
+    ec2_client = get_client('ec2', region_name=region)
+    paginator = ec2_client.get_paginator('describe_volumes')
+    attachments = []
+    for start in range(0, len(instance_ids), DESCRIBE_VOLUMES_BATCH):
+        filters = [{'Name': 'attachment.instance-id', 'Values': list(instance_ids[start:start + DESCRIBE_VOLUMES_BATCH])}]
+        for page in paginator.paginate(Filters=filters):
+            for volume in page['Volumes']:
+                if any(tag['Key'] == KUBERNETES_CLUSTER_TAG for tag in volume.get('Tags', [])):
+                    continue
+                attachments.extend(attachment for attachment in volume['Attachments'] if attachment['DeleteOnTermination'])
+    return attachments
+
+
+def wait_for_volumes_available(region, volume_ids:list):
+    """Wait with the volume_available waiter on the volumes, in batches, returns the available ones and {VolumeId: error} of the others"""
+    ec2_client = get_client('ec2', region_name=region)
+
+    def wait(batch):
+        try:
+            ec2_client.get_waiter('volume_available').wait(VolumeIds=batch, WaiterConfig={'Delay': EBS_WAIT_DELAY, 'MaxAttempts': EBS_WAIT_ATTEMPTS})
+            return batch, {}
+        except WaiterError as e:
+            # the waiter gives up on the whole batch, sort out the volumes which made it
+            try:
+                states = {volume['VolumeId']: volume['State'] for volume in ec2_client.describe_volumes(VolumeIds=batch)['Volumes']}
+            except Exception:
+                return [], {volume_id: e for volume_id in batch}
+            return ([volume_id for volume_id in batch if states.get(volume_id) == 'available'],
+                    {volume_id: f'volume is {states.get(volume_id)}' for volume_id in batch if states.get(volume_id) != 'available'})
+
+    batches = [volume_ids[start:start + DESCRIBE_VOLUMES_BATCH] for start in range(0, len(volume_ids), DESCRIBE_VOLUMES_BATCH)]
+    available = []
+    failures = {}
+    with ThreadPoolExecutor(max_workers=EBS_MAX_WORKERS) as executor:
+        for batch_available, batch_failures in executor.map(wait, batches):
+            available.extend(batch_available)
+            failures.update(batch_failures)
+    return available, failures
+
+
+def retire_volumes(region, instance_ids:list):
+    """Detach the retirable volumes of the stopped instances, wait for them to be available and delete them, each step in parallel.
+    Returns {VolumeId: error} of the volumes which could not be retired"""
+    ec2_client = get_client('ec2', region_name=region)
+    attachments = get_retirable_attachments(region, instance_ids)
+    print('attached_volumes', attachments)
+    if not attachments:
+        return {}
+
+    def detach(attachment):
+        try:
+            ec2_client.detach_volume(Device=attachment['Device'], InstanceId=attachment['InstanceId'], VolumeId=attachment['VolumeId'])
+            print(f'detaching the volume {attachment["VolumeId"]}')
+            return None
+        except Exception as e:
+            return e
+
+    def delete(volume_id):
+        try:
+            ec2_client.delete_volume(VolumeId=volume_id)
+            print(f'Deleted the volume {volume_id}')
+            return None
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=EBS_MAX_WORKERS) as executor:
+        errors = dict(zip([attachment['VolumeId'] for attachment in attachments], executor.map(detach, attachments)))
+        failures = {volume_id: error for volume_id, error in errors.items() if error is not None}
+        available, wait_failures = wait_for_volumes_available(region, [volume_id for volume_id in errors if volume_id not in failures])
+        failures.update(wait_failures)
+        errors = dict(zip(available, executor.map(delete, available)))
+        failures.update({volume_id: error for volume_id, error in errors.items() if error is not None})
+    for volume_id, error in failures.items():
+        print(f'could not retire the volume {volume_id}: {error}')
+    return failures
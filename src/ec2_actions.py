@@ -0,0 +1,123 @@
+import os
+import threading
+from concurrent.futures import Future
+
+from aws_clients import get_client
+from ec2_waiter import get_region_waiter
+
+# instance IDs sent in one StopInstances or StartInstances call
+EC2_ACTION_BATCH = int(os.environ.get('EC2_ACTION_BATCH', 1000))
+# seconds a request waits for the requests of the other clusters of its region before the call goes out
+EC2_ACTION_LINGER = float(os.environ.get('EC2_ACTION_LINGER', 1))
+
+# action -> client method, response key, state the instances are waited on for
+ACTIONS = {
+    'stop': ('stop_instances', 'StoppingInstances', 'stopped'),
+    'start': ('start_instances', 'StartingInstances', 'running'),
+}
+
+
+class region_action_batcher:
+    """Coalesces the stop or start requests of all the clusters of a region into as few calls as the API allows, then maps the
+    state changes back to the request of each cluster"""
+    def __init__(self, region, action:str):
+        self.region = region
+        self.action = action
+        self.method, self.response_key, self.target_state = ACTIONS[action]
+        self.requests = []
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def submit(self, instance_ids:list):
+        """Future of {InstanceId: last state seen} of the given instances, resolved once they reached the target state of the
+        action or gave up, see region_waiter.watch. An instance the call failed for is left at None"""
+        future = Future()
+        if not instance_ids:
+            future.set_result({})
+            return future
+        with self.lock:
+            if self.requests and sum(len(ids) for ids, _ in self.requests) + len(instance_ids) > EC2_ACTION_BATCH:
+                # the queued requests fill a call already, they go out now and this one opens the next
+                threading.Thread(target=self.run_requests, args=(self.requests,), daemon=True).start()
+                self.requests = []
+            self.requests.append((list(instance_ids), future))
+            if self.timer is None:
+                self.timer = threading.Timer(EC2_ACTION_LINGER, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return future
+
+    def flush(self):
+        with self.lock:
+            requests = self.requests
+            self.requests = []
+            self.timer = None
+        self.run_requests(requests)
+
+    def run_requests(self, requests:list):
+        # whole requests are packed into the calls, a cluster is only ever split when it alone exceeds the batch
+        batch = []
+        for instance_ids, future in requests:
+            if batch and sum(len(ids) for ids, _ in batch) + len(instance_ids) > EC2_ACTION_BATCH:
+                self.run_batch(batch)
+                batch = []
+            batch.append((instance_ids, future))
+        if batch:
+            self.run_batch(batch)
+
+    def call(self, instance_ids:list):
+        ec2_client = get_client('ec2', region_name=self.region)
+        states = {}
+        for start in range(0, len(instance_ids), EC2_ACTION_BATCH):
+            response = getattr(ec2_client, self.method)(InstanceIds=instance_ids[start:start + EC2_ACTION_BATCH])
+            states.update({change['InstanceId']: change['CurrentState']['Name'] for change in response[self.response_key]})
+        return states
+
+    def run_batch(self, batch:list):
+        instance_ids = [instance_id for ids, _ in batch for instance_id in ids]
+        try:
+            states = self.call(instance_ids)
+            print(f'{self.action} requested for {len(instance_ids)} instances of {len(batch)} clusters in {self.region}')
+        except Exception as e:
+            if len(batch) > 1:
+                # one instance in the wrong state fails the whole call, the other clusters should not pay for it
+                print(f'could not {self.action} {len(instance_ids)} instances in {self.region} at once, retrying per cluster: {e}')
+                for request in batch:
+                    self.run_batch([request])
+                return
+            print(f'could not {self.action} the instances {instance_ids} in {self.region}: {e}')
+            states = {}
+        for ids, future in batch:
+            self.watch(ids, {instance_id: states[instance_id] for instance_id in ids if instance_id in states}, future)
+
+    def watch(self, instance_ids:list, states:dict, future:Future):
+        outcomes = dict.fromkeys(instance_ids)
+        outcomes.update(states)
+
+        def resolve(watched:Future):
+            outcomes.update(watched.result())
+            future.set_result(outcomes)
+
+        get_region_waiter(self.region).watch(list(states), self.target_state).add_done_callback(resolve)
+
+
+_lock = threading.Lock()
+_batchers = {}
+
+
+def get_action_batcher(region, action:str):
+    """Batcher of the action in the region, shared by every cluster of the run"""
+    with _lock:
+        if (region, action) not in _batchers:
+            _batchers[(region, action)] = region_action_batcher(region, action)
+        return _batchers[(region, action)]
+
+
+def stop_instances(region, instance_ids:list):
+    """Stop the instances along with those of the other clusters of the region, future of {InstanceId: last state seen}"""
+    return get_action_batcher(region, 'stop').submit(instance_ids)
+
+
+def start_instances(region, instance_ids:list):
+    """Start the instances along with those of the other clusters of the region, future of {InstanceId: last state seen}"""
+    return get_action_batcher(region, 'start').submit(instance_ids)
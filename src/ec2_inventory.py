@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from aws_clients import get_client
+
+# upper bound on the number of regions scanned at the same time
+MAX_REGION_WORKERS = int(os.environ.get('MAX_REGION_WORKERS', 8))
+
+# states fetched by a full inventory sweep, anything else is irrelevant for hibernation
+INVENTORY_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+HCP_NAME_TAG = 'api.openshift.com/name'
+# IPI nodes carry kubernetes.io/cluster/<infra-id>=owned, where infra-id is <internal name>-<random suffix>
+IPI_CLUSTER_TAG_PREFIX = 'kubernetes.io/cluster/'
+
+
+def get_regions():
+    client = get_client('ec2', region_name='us-east-1')
+    return [region['RegionName'] for region in client.describe_regions()['Regions']]
+
+
+class ec2_instance:
+    """Projection of a DescribeInstances entry onto the fields used by hibernation and cleanup"""
+    __slots__ = ('id', 'state', 'vpc_id', 'tags', 'network_interface_ids')
+
+    def __init__(self, instance:dict):
+        self.id = instance['InstanceId']
+        # states and VPC ids repeat across thousands of instances, share one copy of each
+        self.state = sys.intern(instance['State']['Name'])
+        self.vpc_id = sys.intern(instance['VpcId']) if instance.get('VpcId') else None
+        self.tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+        self.network_interface_ids = tuple(interface['NetworkInterfaceId'] for interface in instance.get('NetworkInterfaces', []))
+
+
+def iter_instances_for_region(region, states, filters:list=None):
+    """Yield the instances in the given state(s) as ec2_instance records page by page, following NextToken until the region is exhausted.
+    filters are additional DescribeInstances filters evaluated server side"""
+    ec2_client = get_client('ec2', region_name=region)
+    filters = [{'Name': 'instance-state-name', 'Values': [states] if isinstance(states, str) else list(states)}] + (filters or [])
+    paginator = ec2_client.get_paginator('describe_instances')
+    for page in paginator.paginate(Filters=filters, PaginationConfig={'PageSize': 1000}):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                yield ec2_instance(instance)
+
+
+class region_inventory:
+    """Instances of a region fetched in a single sweep, keyed by InstanceId with secondary indexes built in the same pass"""
+    def __init__(self, region):
+        self.region = region
+        self.instances = {}
+        # secondary indexes, key -> InstanceIds
+        self.states = {}
+        self.vpcs = {}
+        self.hcp_names = {}
+        # IPI internal name, parsed from the infra-id of the kubernetes.io/cluster tag
+        self.ipi_names = {}
+
+    def add(self, instance:ec2_instance):
+        if instance.id in self.instances:
+            return
+        self.instances[instance.id] = instance
+        tags = instance.tags
+        self.states.setdefault(instance.state, []).append(instance.id)
+        if instance.vpc_id:
+            self.vpcs.setdefault(instance.vpc_id, []).append(instance.id)
+        if HCP_NAME_TAG in tags:
+            self.hcp_names.setdefault(tags[HCP_NAME_TAG], []).append(instance.id)
+        if 'red-hat-clustertype' not in tags and HCP_NAME_TAG not in tags:
+            for key, value in tags.items():
+                if key.startswith(IPI_CLUSTER_TAG_PREFIX) and value == 'owned':
+                    infra_id = key[len(IPI_CLUSTER_TAG_PREFIX):]
+                    self.ipi_names.setdefault(infra_id.rsplit('-', 1)[0], []).append(instance.id)
+                    break
+
+    def _lookup(self, index:dict, key:str, states:tuple):
+        instances = [self.instances[instance_id] for instance_id in index.get(key, [])]
+        return [instance for instance in instances if not states or instance.state in states]
+
+    def state(self, *states):
+        """Instances in any of the given states"""
+        return [self.instances[instance_id] for state in states for instance_id in self.states.get(state, [])]
+
+    def hcp_workers(self, cluster_name:str, *states):
+        """Worker instances of the given HCP cluster, optionally limited to the given states"""
+        return self._lookup(self.hcp_names, cluster_name, states)
+
+    def ipi_nodes(self, internal_name:str, *states):
+        """Instances owned by the given IPI cluster, optionally limited to the given states"""
+        return self._lookup(self.ipi_names, internal_name, states)
+
+
+def get_inventory_for_region(region, states=INVENTORY_STATES):
+    inventory = region_inventory(region)
+    for instance in iter_instances_for_region(region, states):
+        inventory.add(instance)
+    print(region, {state: len(inventory.states.get(state, [])) for state in states})
+    return inventory
+
+
+def get_hcp_workers(region, cluster_name:str, states):
+    """Worker instances of the given HCP cluster, filtered server side by the cluster name tag"""
+    filters = [{'Name': f'tag:{HCP_NAME_TAG}', 'Values': [cluster_name]}]
+    return list(iter_instances_for_region(region, states, filters))
+
+
+def scan_regions(scan, regions:list, max_workers:int=MAX_REGION_WORKERS):
+    """Run scan(region) for all the regions in parallel, a failing region does not abort the others"""
+    results = {}
+    failures = {}
+
+    def timed_scan(region):
+        start = time.monotonic()
+        try:
+            return scan(region), None, time.monotonic() - start
+        except Exception as e:
+            return None, e, time.monotonic() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(timed_scan, region): region for region in regions}
+        for future in as_completed(futures):
+            region = futures[future]
+            result, error, elapsed = future.result()
+            if error is None:
+                results[region] = result
+                print(f'scanned region {region} in {elapsed:.2f}s')
+            else:
+                failures[region] = error
+                print(f'failed to scan region {region} after {elapsed:.2f}s: {error}')
+    return results, failures
+
+
+def get_cluster_regions(clusters:list):
+    """Regions hosting the clusters whose nodes are managed directly on EC2 (IPI and HCP)"""
+    return sorted({cluster.region for cluster in clusters if cluster.hcp == 'true' or cluster.type == 'ocp'})
+
+
+def get_inventory(inventory:dict, states=INVENTORY_STATES, regions=None):
+    """Fill inventory with {region: region_inventory} in one sweep for all the states, returns the regions which could not be scanned.
+    regions limits the scan to the given regions, by default it sweeps every enabled region"""
+    regions = get_regions() if regions is None else regions
+    print(f'scanning {len(regions)} regions for instances in {states}')
+    results, failures = scan_regions(lambda region: get_inventory_for_region(region, states), regions)
+    inventory.update(results)
+    return failures
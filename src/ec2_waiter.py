@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+
+# DescribeInstances takes at most this many InstanceIds per call, and this many values per filter
+DESCRIBE_INSTANCES_BATCH = 1000
+DESCRIBE_FILTER_BATCH = 200
+# pause before the first poll, doubled after every poll up to the maximum
+EC2_WAIT_POLL_START = int(os.environ.get('EC2_WAIT_POLL_START', 5))
+EC2_WAIT_POLL_MAX = int(os.environ.get('EC2_WAIT_POLL_MAX', 30))
+# seconds after which the instances which did not reach the target state are given up on
+EC2_WAIT_TIMEOUT = int(os.environ.get('EC2_WAIT_TIMEOUT', 600))
+
+# states an instance never leaves, waiting on it for anything else is pointless
+FINAL_STATES = ('shutting-down', 'terminated')
+
+
+def describe_instance_states(region, instance_ids:list):
+    """{InstanceId: state} of the given instances, instances EC2 does not know (yet) are left out"""
+    ec2_client = get_client('ec2', region_name=region)
+    states = {}
+    for start in range(0, len(instance_ids), DESCRIBE_INSTANCES_BATCH):
+        batch = list(instance_ids[start:start + DESCRIBE_INSTANCES_BATCH])
+        try:
+            reservations = ec2_client.describe_instances(InstanceIds=batch)['Reservations']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'InvalidInstanceID.NotFound':
+                raise
+            # one unknown ID fails the whole call, an instance-id filter skips it instead
+            paginator = ec2_client.get_paginator('describe_instances')
+            reservations = [reservation for index in range(0, len(batch), DESCRIBE_FILTER_BATCH)
+                            for page in paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': batch[index:index + DESCRIBE_FILTER_BATCH]}])
+                            for reservation in page['Reservations']]
+        for reservation in reservations:
+            for instance in reservation['Instances']:
+                states[instance['InstanceId']] = instance['State']['Name']
+    return states
+
+
+class region_waiter:
+    """Waits on the instances of any number of clusters of a region with a single polling loop, every poll describes all the
+    pending instances in as few DescribeInstances calls as the API allows and resolves the future of each settled watch"""
+    def __init__(self, region):
+        self.region = region
+        self.watches = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.thread = None
+        self.delay = EC2_WAIT_POLL_START
+        self.next_poll = 0
+
+    def watch(self, instance_ids:list, target_state:str, timeout:int=EC2_WAIT_TIMEOUT):
+        """Future of {InstanceId: last state seen} of the given instances, resolved once they are all in target_state,
+        in a final state, or the timeout expired. None is the state of an instance never seen"""
+        future = Future()
+        if not instance_ids:
+            future.set_result({})
+            return future
+        now = time.monotonic()
+        watch = {'future': future, 'target_state': target_state, 'timeout': timeout, 'deadline': now + timeout,
+                 'outcomes': dict.fromkeys(instance_ids)}
+        with self.lock:
+            self.watches.append(watch)
+            # the backoff restarts for every new watch, its instances get their first poll soon whatever the others reached
+            self.delay = EC2_WAIT_POLL_START
+            if self.thread is None:
+                self.next_poll = now + self.delay
+                self.thread = threading.Thread(target=self.run, name=f'ec2-waiter-{self.region}', daemon=True)
+                self.thread.start()
+            else:
+                self.next_poll = min(self.next_poll, now + self.delay)
+                self.wakeup.notify()
+        return future
+
+    def next_watches(self):
+        """Sleep until the next poll is due, returns the watches to poll, none once there is nothing left to wait on"""
+        with self.lock:
+            while self.watches:
+                now = time.monotonic()
+                if now >= self.next_poll:
+                    return list(self.watches)
+                self.wakeup.wait(self.next_poll - now)
+            self.thread = None
+            return []
+
+    def run(self):
+        watches = self.next_watches()
+        while watches:
+            pending = sorted({instance_id for watch in watches for instance_id, state in watch['outcomes'].items()
+                              if state != watch['target_state'] and state not in FINAL_STATES})
+            try:
+                states = describe_instance_states(self.region, pending)
+            except Exception as e:
+                # the watches are bounded by their deadline, the next poll tries again
+                print(f'could not describe {len(pending)} instances in {self.region}: {e}')
+                states = {}
+            now = time.monotonic()
+            settled = []
+            with self.lock:
+                for watch in watches:
+                    outcomes = watch['outcomes']
+                    outcomes.update({instance_id: states[instance_id] for instance_id in outcomes if instance_id in states})
+                    waiting = {instance_id: state for instance_id, state in outcomes.items()
+                               if state != watch['target_state'] and state not in FINAL_STATES}
+                    if not waiting:
+                        settled.append(watch)
+                    elif now >= watch['deadline']:
+                        print(f'gave up after {watch["timeout"]}s waiting for {len(waiting)} instances to be {watch["target_state"]}', waiting)
+                        settled.append(watch)
+                for watch in settled:
+                    self.watches.remove(watch)
+                if self.watches:
+                    print(f'instances of {len(self.watches)} clusters in {self.region} not settled yet, please wait...')
+                self.delay = min(self.delay * 2, EC2_WAIT_POLL_MAX)
+                self.next_poll = min([now + self.delay] + [watch['deadline'] for watch in self.watches])
+            for watch in settled:
+                watch['future'].set_result(dict(watch['outcomes']))
+            watches = self.next_watches()
+
+
+_lock = threading.Lock()
+_waiters = {}
+
+
+def get_region_waiter(region):
+    """Waiter of the region, shared by every cluster of the run so their instances are polled together"""
+    with _lock:
+        if region not in _waiters:
+            _waiters[region] = region_waiter(region)
+        return _waiters[region]
+
+
+def get_unsettled_instances(watches:dict, target_state:str):
+    """Wait for the futures of region_waiter.watch, returns {key: {InstanceId: state}} of the instances not in target_state.
+    A key without a future had no instances to wait on"""
+    unsettled = {}
+    for key, future in watches.items():
+        if future is None:
+            continue
+        outcomes = {instance_id: state for instance_id, state in future.result().items() if state != target_state}
+        if outcomes:
+            unsettled[key] = outcomes
+    return unsettled
@@ -14,7 +14,7 @@ import json
 import sys
 import time
 from datetime import datetime, timedelta
-import boto3
+from aws_clients import get_client
 from botocore.exceptions import ClientError, NoCredentialsError
 
 
@@ -23,8 +23,7 @@ class ElasticIPCleaner:
         self.dry_run = dry_run
         self.region_name = region_name
         try:
-            self.session = boto3.Session(region_name=region_name)
-            self.ec2_client = self.session.client("ec2")
+            self.ec2_client = get_client("ec2", region_name=region_name)
             print(f"Initialized EC2 client for region: {region_name}")
         except NoCredentialsError:
             print("Error: AWS credentials not found. Please configure AWS credentials.")
@@ -1,78 +1,34 @@
 import json
-import boto3
-import time, datetime
-import os
+import datetime
 import smartsheet
 import re
+from ec2_inventory import get_cluster_regions, get_inventory, region_inventory
+from ec2_actions import stop_instances
+from ec2_waiter import get_unsettled_instances
+from ocm_client import get_clusters_for_accounts, get_ocm_client, run_cluster_actions
 
 class oc_cluster:
     def __init__(self, cluster_detail, ocm_account):
-        details = cluster_detail.split(' ')
-        details = [detail for detail in details if detail]
-        self.id = details[0]
-        self.name = details[1]
-        self.internal_name = details[1]
-        self.api_url = details[2]
-        self.ocp_version = details[3]
-        self.type = details[4]
-        self.hcp = details[5]
-        self.cloud_provider = details[6]
-        self.region = details[7]
-        self.status = details[8]
+        self.id = cluster_detail['id']
+        self.name = cluster_detail['name']
+        self.internal_name = cluster_detail['name']
+        self.api_url = cluster_detail.get('api', {}).get('url', '')
+        self.ocp_version = cluster_detail.get('openshift_version', '')
+        self.type = cluster_detail['product']['id']
+        self.hcp = 'true' if cluster_detail.get('hypershift', {}).get('enabled') else 'false'
+        self.cloud_provider = cluster_detail['cloud_provider']['id']
+        self.region = cluster_detail['region']['id']
+        self.status = cluster_detail['state']
         self.nodes = []
         self.hibernate_error = ''
         self.ocm_account = ocm_account
         self.inactive_hours_start = None
         self.inactive_hours_end = None
 
-def get_instances_for_region(region, current_state):
-    ec2_client = boto3.client('ec2', region_name=region)
-    filters = [{'Name': 'instance-state-name', 'Values': [current_state]}]
-    ec2_map = ec2_client.describe_instances(Filters=filters, MaxResults=1000)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    ec2_map = {list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))[0]['Value']: instance for instance in
-               ec2_map if list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))}
-    print(region, len(ec2_map))
-    return ec2_map
-
-def get_all_instances(ec2_instances, current_state):
-    client = boto3.client('ec2', region_name='us-east-1')
-    regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
-    for region in regions:
-        ec2_instances[region] = get_instances_for_region(region, current_state)
-def worker_node_belongs_to_the_hcp_cluster(ec2_instance:dict, cluster_name:str):
-    """Check if an EC2 instance belongs to a specific HCP cluster """
-    result = False
-    for tag in ec2_instance['Tags']:
-        if tag['Key'] == 'api.openshift.com/name' and tag['Value'] == cluster_name:
-            result = True
-            break
-    return result
-
-def check_if_given_tag_exists(tag_name, tags:list[dict]):
-    print(tags)
-    result = False
-    for tag in tags:
-        if tag['Key'] == tag_name:
-            result = True
-            break
-    return result
-
-def delete_volume(volume_id, region):
-    ec2_client = boto3.client('ec2', region_name=region)
-    for attempt in range(7):
-        try:
-            ec2_client.delete_volume(VolumeId=volume_id)
-            print(f'Deleted the volume {volume_id}')
-        except:
-            time.sleep(5)
-
-def get_ipi_cluster_name(cluster:oc_cluster):
+def get_ipi_cluster_name(cluster:oc_cluster, cluster_detail:dict):
     if cluster.name.count('-') == 4:
         try:
-            url = run_command(f'ocm describe cluster {cluster.id} | grep "Console URL:"')
-            url = url.replace('Console URL:', '').strip()
+            url = get_ocm_client(cluster.ocm_account).get_console_url(cluster_detail)
             result = re.search(r"^https:\/\/console-openshift-console.apps.(.*).ocp2.odhdev.com$", url)
             if result:
                 cluster.internal_name = result.group(1)
@@ -80,64 +36,30 @@ def get_ipi_cluster_name(cluster:oc_cluster):
             print(f'could not retrieve internal name for IPI cluster {cluster.name}, the cluster seems stale or non-existent')
 
 def get_all_cluster_details(ocm_account:str, clusters:dict):
-    get_cluster_list(ocm_account)
-    clusters_details = open(f'clusters_{ocm_account}.txt').readlines()
-    for cluster_detail in clusters_details:
+    for cluster_detail in get_cluster_list(ocm_account):
         cluster = oc_cluster(cluster_detail, ocm_account)
         if cluster.type == 'ocp':
-            get_ipi_cluster_name(cluster)
+            get_ipi_cluster_name(cluster, cluster_detail)
         if cluster.cloud_provider == 'aws' and (
                 cluster.type != 'ocp' or (cluster.type == 'ocp' and cluster.name != cluster.internal_name)):
             clusters.append(cluster)
     # clusters = [cluster for cluster in clusters if cluster.cloud_provider == 'aws']
 
 def get_cluster_list(ocm_account:str):
-    run_command(f'script/./get_all_cluster_details.sh {ocm_account}')
-
-def run_command(command):
-    print(command)
-    output = os.popen(command).read()
-    # print(output)
-    return output
+    return get_ocm_client(ocm_account).list_clusters()
 
 
-def hybernate_hypershift_cluster(cluster:oc_cluster, ec2_map:dict):
-    # ec2_map = ec2_instances[cluster.region]
-    worker_nodes = [ec2_name for ec2_name in ec2_map]
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    InstanceIds = [ec2_map[worker_node]['InstanceId'] for worker_node in worker_nodes if worker_node_belongs_to_the_hcp_cluster(ec2_map[worker_node], cluster.name)]
+def hybernate_hypershift_cluster(cluster:oc_cluster, inventory:region_inventory):
+    result = None
+    InstanceIds = [instance.id for instance in inventory.hcp_workers(cluster.name, 'running')]
     if len(InstanceIds) > 0:
         print(f'Stopping Worker Instances of cluster {cluster.name}', InstanceIds)
-        worker_count = len(InstanceIds)
-        ec2_client.stop_instances(InstanceIds=InstanceIds)
+        result = stop_instances(cluster.region, InstanceIds)
 
         print(f'Started hibernating the cluster {cluster.name}')
     else:
         print(f'Cluster {cluster.name} is already hibernated.')
-
-def get_instance_status(cluster:oc_cluster, InstanceIds:list):
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    ec2_map = ec2_client.describe_instances(InstanceIds=InstanceIds)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    status_map = {ec2['InstanceId']:ec2['State']['Name'] for ec2 in ec2_map}
-    return status_map
-
-def wait_for_rosa_cluster_to_be_hibernated(cluster:oc_cluster, worker_count:int):
-    time.sleep(5)
-    ec2_map = get_instances_for_region(cluster.region, 'stopped')
-    InstanceIds = [ec2_map[ec2_name]['InstanceId'] for ec2_name in ec2_map if worker_node_belongs_to_the_hcp_cluster(ec2_map[ec2_name], cluster.name)]
-    while len(InstanceIds) < worker_count:
-        print('Worker nodes stopping, please wait...')
-        time.sleep(5)
-        ec2_map = get_instances_for_region(cluster.region, 'stopped')
-        InstanceIds = [ec2_map[ec2_name]['InstanceId'] for ec2_name in ec2_map if worker_node_belongs_to_the_hcp_cluster(ec2_map[ec2_name], cluster.name)]
-
-    status_map = get_instance_status(cluster, InstanceIds)
-    while set(status_map.values()) != set(['stopped']):
-        print('Worker nodes stopping, please wait...')
-        time.sleep(5)
-        status_map = get_instance_status(cluster, InstanceIds)
+    return result
 
 def get_clusters_from_smartsheet():
     column_map = {}
@@ -152,7 +74,7 @@ def get_clusters_from_smartsheet():
     return smartsheet_data
 
 def hibernate_cluster(cluster: oc_cluster):
-    run_command(f'script/./hybernate_cluster.sh {cluster.ocm_account} {cluster.id}')
+    get_ocm_client(cluster.ocm_account).hibernate_cluster(cluster.id)
 
 def good_time_to_hibernate_cluster(inactive_hours_start:str):
     buffer_hours = 2
@@ -175,41 +97,23 @@ def good_time_to_hibernate_cluster(inactive_hours_start:str):
 
     return 0 <= diff <= buffer_seconds
 
-def worker_node_belongs_to_the_ipi_cluster(ec2_instance:dict, cluster_name:str):
-    tags = {tag['Key']:tag['Value'] for tag in ec2_instance['Tags']}
-    result = 'red-hat-clustertype' not in tags and 'api.openshift.com/name' not in tags
-    for key, value in tags.items():
-        if key.startswith(f'kubernetes.io/cluster/{cluster_name}-') and value == 'owned':
-            result = result and True
-            break
-    return result
-def hibernate_ipi_cluster(cluster:oc_cluster, ec2_map:dict):
+def hibernate_ipi_cluster(cluster:oc_cluster, inventory:region_inventory):
 
-    result = False
-    worker_nodes = [ec2_name for ec2_name in ec2_map if ec2_name.startswith(f'{cluster.internal_name}-')]
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    InstanceIds = [ec2_map[worker_node]['InstanceId'] for worker_node in worker_nodes if worker_node_belongs_to_the_ipi_cluster(ec2_map[worker_node], cluster.internal_name)]
+    result = None
+    InstanceIds = [instance.id for instance in inventory.ipi_nodes(cluster.internal_name, 'running')]
     if len(InstanceIds) > 0:
         print(f'Stopping Worker Instances of cluster {cluster.name}', InstanceIds)
-        worker_count = len(InstanceIds)
-        ec2_client.stop_instances(InstanceIds=InstanceIds)
+        result = stop_instances(cluster.region, InstanceIds)
         print(f'Started hibernating the cluster {cluster.name}')
-        result = True
     else:
         print(f'Cluster {cluster.name} is already hibernated.')
     return result
 
 def resume_cluster(cluster: oc_cluster):
-    run_command(f'script/./resume_cluster.sh {cluster.ocm_account} {cluster.id}')
+    get_ocm_client(cluster.ocm_account).resume_cluster(cluster.id)
 def main():
-    ec2_instances = {}
-    get_all_instances(ec2_instances, 'running')
-
     clusters:list[oc_cluster] = []
-    ocm_accounts = ['PROD', 'STAGE']
-
-    for ocm_account in ocm_accounts:
-        get_all_cluster_details(ocm_account, clusters)
+    get_clusters_for_accounts(get_all_cluster_details, clusters)
 
     smartsheet_data = get_clusters_from_smartsheet()
 
@@ -233,30 +137,37 @@ def main():
             smartsheet_cluster_info[0] += ':00'
         cluster.inactive_hours_start = smartsheet_cluster_info[0]
 
-    hibernated_clusters = []
-    no_action_clusters = []
+    clusters_to_hibernate = [cluster for cluster in clusters if cluster.inactive_hours_start and good_time_to_hibernate_cluster(cluster.inactive_hours_start)]
 
-    for cluster in clusters:
-    
-        if cluster.inactive_hours_start and good_time_to_hibernate_cluster(cluster.inactive_hours_start):
-            if cluster.hcp == "false":
-                if cluster.type == 'ocp':
-                    print("Hibernating IPI Cluster - ", cluster.name)
-                    hibernate_ipi_cluster(cluster, ec2_instances[cluster.region])
-                else:
-                    print("Hibernating OSD or ROSA Classic Cluster - ", cluster.name)
-                    hibernate_cluster(cluster)
+    inventory = {}
+    failed_regions = get_inventory(inventory, ['running'], get_cluster_regions(clusters_to_hibernate))
+
+    classic_failures = run_cluster_actions('hibernate', [cluster for cluster in clusters_to_hibernate if cluster.hcp == 'false' and cluster.type != 'ocp'])
+    hibernated_clusters = []
+    # instances stopped per cluster, confirmed together once every cluster was handled
+    watches = {}
+    for cluster in clusters_to_hibernate:
+        if cluster.region in failed_regions and (cluster.hcp == "true" or cluster.type == 'ocp'):
+            print(f'Skipping {cluster.name}, could not list the instances in region {cluster.region}')
+            continue
+        if cluster.hcp == "false":
+            if cluster.type == 'ocp':
+                print("Hibernating IPI Cluster - ", cluster.name)
+                watches[cluster.id] = hibernate_ipi_cluster(cluster, inventory[cluster.region])
             else:
-                hybernate_hypershift_cluster(cluster, ec2_instances[cluster.region])
-                print("Hibernating Hypershift Cluster - ", cluster.name)
-            hibernated_clusters.append(cluster.__dict__)
+                if cluster.id in classic_failures:
+                    continue
+                print("Hibernating OSD or ROSA Classic Cluster - ", cluster.name)
         else:
-            no_action_clusters.append(cluster.__dict__)
+            watches[cluster.id] = hybernate_hypershift_cluster(cluster, inventory[cluster.region])
+            print("Hibernating Hypershift Cluster - ", cluster.name)
+        hibernated_clusters.append(cluster.__dict__)
+    not_stopped = get_unsettled_instances(watches, 'stopped')
+    for cluster in clusters_to_hibernate:
+        if cluster.id in not_stopped:
+            print(f'Worker nodes of cluster {cluster.name} did not stop', not_stopped[cluster.id])
 
     # print(json.dumps(hibernated_clusters, indent=4))
 
-    print("No action taken for the following cluster:")
-    # print(json.dumps(no_action_clusters, indent=4))
-
 if __name__ == '__main__':
     main()
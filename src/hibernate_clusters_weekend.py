@@ -1,199 +1,144 @@
 import json
-import time
 
-import boto3
-import os
+from aws_clients import get_client
+import re
+from cluster_executor import run_for_clusters
+from ec2_inventory import get_cluster_regions, get_inventory, region_inventory
+from ec2_actions import stop_instances
+from ec2_waiter import get_unsettled_instances
+from ocm_client import get_clusters_for_accounts, get_ocm_client, run_cluster_actions
+
+DO_NOT_HIBERNATE_LIST = ['vteam-uat', 'vteam-stage']
 
 
 class oc_cluster:
     def __init__(self, cluster_detail, ocm_account):
-        details = cluster_detail.split(' ')
-        details = [detail for detail in details if detail]
-        self.id = details[0]
-        self.name = details[1]
-        self.internal_name = details[1]
-        self.api_url = details[2]
-        self.ocp_version = details[3]
-        self.type = details[4]
-        self.hcp = details[5]
-        self.cloud_provider = details[6]
-        self.region = details[7]
-        self.status = details[8]
+        self.id = cluster_detail['id']
+        self.name = cluster_detail['name']
+        self.internal_name = cluster_detail['name']
+        self.api_url = cluster_detail.get('api', {}).get('url', '')
+        self.ocp_version = cluster_detail.get('openshift_version', '')
+        self.type = cluster_detail['product']['id']
+        self.hcp = 'true' if cluster_detail.get('hypershift', {}).get('enabled') else 'false'
+        self.cloud_provider = cluster_detail['cloud_provider']['id']
+        self.region = cluster_detail['region']['id']
+        self.status = cluster_detail['state']
         self.nodes = []
         self.hibernate_error = ''
         self.ocm_account = ocm_account
 def get_all_cluster_details(ocm_account:str, clusters:dict):
-    get_cluster_list(ocm_account)
-    clusters_details = open(f'clusters_{ocm_account}.txt').readlines()
-    for cluster_detail in clusters_details:
+    for cluster_detail in get_cluster_list(ocm_account):
         cluster = oc_cluster(cluster_detail, ocm_account)
         if cluster.type == 'ocp':
-            get_ipi_cluster_name(cluster)
+            get_ipi_cluster_name(cluster, cluster_detail)
         if cluster.cloud_provider == 'aws' and (
                 cluster.type != 'ocp' or (cluster.type == 'ocp' and cluster.name != cluster.internal_name)):
             clusters.append(cluster)
     # clusters = [cluster for cluster in clusters if cluster.cloud_provider == 'aws']
 
-def get_ipi_cluster_name(cluster:oc_cluster):
+def get_ipi_cluster_name(cluster:oc_cluster, cluster_detail:dict):
     if cluster.name.count('-') == 4:
         try:
-            url = run_command(f'ocm describe cluster {cluster.id} | grep "Console URL:"')
-            url = url.replace('Console URL:', '').strip()
+            url = get_ocm_client(cluster.ocm_account).get_console_url(cluster_detail)
             result = re.search(r"^https:\/\/console-openshift-console.apps.(.*).ocp2.odhdev.com$", url)
             if result:
                 cluster.internal_name = result.group(1)
         except:
             print(f'could not retrieve internal name for IPI cluster {cluster.name}, the cluster seems stale or non-existent')
 
-def get_instances_for_region(region, current_state):
-    ec2_client = boto3.client('ec2', region_name=region)
-    filters = [{'Name': 'instance-state-name', 'Values': [current_state]}]
-    ec2_map = ec2_client.describe_instances(Filters=filters, MaxResults=1000)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    ec2_map = {list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))[0]['Value']: instance for instance in
-               ec2_map if list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))}
-    print(region, len(ec2_map))
-    return ec2_map
-
-def get_all_instances(ec2_instances, current_state):
-    client = boto3.client('ec2', region_name='us-east-1')
-    regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
-    for region in regions:
-        ec2_instances[region] = get_instances_for_region(region, current_state)
-
-
 def get_cluster_list(ocm_account:str):
-    run_command(f'script/./get_all_cluster_details.sh {ocm_account}')
-
-def worker_node_belongs_to_the_hcp_cluster(ec2_instance:dict, cluster_name:str):
-    """Check if an EC2 instance belongs to a specific HCP cluster """
-    result = False
-    for tag in ec2_instance['Tags']:
-        if tag['Key'] == 'api.openshift.com/name' and tag['Value'] == cluster_name:
-            result = True
-            break
-    return result
-
-def worker_node_belongs_to_the_ipi_cluster(ec2_instance:dict, cluster_name:str):
-    tags = {tag['Key']:tag['Value'] for tag in ec2_instance['Tags']}
-    result = 'red-hat-clustertype' not in tags and 'api.openshift.com/name' not in tags
-    for key, value in tags.items():
-        if key.startswith(f'kubernetes.io/cluster/{cluster_name}-') and value == 'owned':
-            result = result and True
-            break
-    return result
-
-def check_if_given_tag_exists(tag_name, tags:list[dict]):
-    print(tags)
-    result = False
-    for tag in tags:
-        if tag['Key'] == tag_name:
-            result = True
-            break
-    return result
+    return get_ocm_client(ocm_account).list_clusters()
 
-def delete_volume(volume_id, region):
-    ec2_client = boto3.client('ec2', region_name=region)
-    for attempt in range(7):
-        try:
-            ec2_client.delete_volume(VolumeId=volume_id)
-            print(f'Deleted the volume {volume_id}')
-        except:
-            time.sleep(5)
-def hybernate_hypershift_cluster(cluster:oc_cluster, ec2_map:dict):
-    # ec2_map = ec2_instances[cluster.region]
-    result = False
-    worker_nodes = [ec2_name for ec2_name in ec2_map]
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    InstanceIds = [ec2_map[worker_node]['InstanceId'] for worker_node in worker_nodes if worker_node_belongs_to_the_hcp_cluster(ec2_map[worker_node], cluster.name)]
+def hybernate_hypershift_cluster(cluster:oc_cluster, inventory:region_inventory):
+    result = None
+    InstanceIds = [instance.id for instance in inventory.hcp_workers(cluster.name, 'running')]
     if len(InstanceIds) > 0:
         print(f'Stopping Worker Instances of cluster {cluster.name}', InstanceIds)
-        worker_count = len(InstanceIds)
-        ec2_client.stop_instances(InstanceIds=InstanceIds)
+        result = stop_instances(cluster.region, InstanceIds)
 
         print(f'Started hibernating the cluster {cluster.name}')
-        result = True
     else:
         print(f'Cluster {cluster.name} is already hibernated.')
     return result
 
-def hibernate_ipi_cluster(cluster:oc_cluster, ec2_map:dict):
+def hibernate_ipi_cluster(cluster:oc_cluster, inventory:region_inventory):
 
-    result = False
-    worker_nodes = [ec2_name for ec2_name in ec2_map if ec2_name.startswith(f'{cluster.internal_name}-')]
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    InstanceIds = [ec2_map[worker_node]['InstanceId'] for worker_node in worker_nodes if worker_node_belongs_to_the_ipi_cluster(ec2_map[worker_node], cluster.internal_name)]
+    result = None
+    InstanceIds = [instance.id for instance in inventory.ipi_nodes(cluster.internal_name, 'running')]
     if len(InstanceIds) > 0:
         print(f'Stopping Worker Instances of cluster {cluster.name}', InstanceIds)
-        worker_count = len(InstanceIds)
-        ec2_client.stop_instances(InstanceIds=InstanceIds)
+        result = stop_instances(cluster.region, InstanceIds)
         print(f'Started hibernating the cluster {cluster.name}')
-        result = True
     else:
         print(f'Cluster {cluster.name} is already hibernated.')
     return result
 
 
-def get_instance_status(cluster:oc_cluster, InstanceIds:list):
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    ec2_map = ec2_client.describe_instances(InstanceIds=InstanceIds)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    status_map = {ec2['InstanceId']:ec2['State']['Name'] for ec2 in ec2_map}
-    return status_map
-
-def run_command(command):
-    print(command)
-    output = os.popen(command).read()
-    # print(output)
-    return output
-
 def hibernate_cluster(cluster: oc_cluster):
-    run_command(f'script/./hybernate_cluster.sh {cluster.ocm_account} {cluster.id}')
+    get_ocm_client(cluster.ocm_account).hibernate_cluster(cluster.id)
 
 def resume_cluster(cluster: oc_cluster):
-    run_command(f'script/./resume_cluster.sh {cluster.ocm_account} {cluster.id}')
-def main():
-    ec2_instances = {}
-    get_all_instances(ec2_instances, 'running')
+    get_ocm_client(cluster.ocm_account).resume_cluster(cluster.id)
+def hibernate_weekend_cluster(cluster:oc_cluster, inventory:dict, failed_regions:dict, classic_failures:dict):
+    """Hibernate one cluster, returns whether it goes into hibernated_latest.json and the future of its stopping instances"""
+    print('starting with', cluster.name, cluster.type)
+    outcome = True
+    stopping = None
+    if cluster.name in DO_NOT_HIBERNATE_LIST:
+        print(f'skipping the cluster {cluster.name}')
+        return False, None
+    elif cluster.region in failed_regions and (cluster.hcp == "true" or cluster.type == 'ocp'):
+        print(f'Skipping {cluster.name}, could not list the instances in region {cluster.region}')
+        return False, None
+    elif cluster.hcp == "false":
+        if cluster.type == 'ocp':
+            stopping = hibernate_ipi_cluster(cluster, inventory[cluster.region])
+            print('hibernating IPI cluster - ', cluster.name)
+        else:
+            outcome = cluster.id not in classic_failures
+            print("OSD or ROSA Classic - ", cluster.name)
+    else:
+        stopping = hybernate_hypershift_cluster(cluster, inventory[cluster.region])
+        outcome = stopping is not None
+        print("Hypershift cluster - ", cluster.name)
+    print(f'Hibernated {cluster.name}')
+    return outcome, stopping
 
+def main():
     clusters = []
-    ocm_accounts = ['PROD', 'STAGE']
-
-    for ocm_account in ocm_accounts:
-        get_all_cluster_details(ocm_account, clusters)
+    get_clusters_for_accounts(get_all_cluster_details, clusters)
 
     clusters_to_hibernate = [cluster for cluster in clusters if cluster.cloud_provider == 'aws' and cluster.status == 'ready']
     print('cluster to hibernate')
     for cluster in clusters_to_hibernate:
         print(cluster.name, cluster.type)
-    DO_NOT_HIBERNATE_LIST = ['vteam-uat', 'vteam-stage']
 
+    inventory = {}
+    failed_regions = get_inventory(inventory, ['running'], get_cluster_regions(clusters_to_hibernate))
+    classic_failures = run_cluster_actions('hibernate', [cluster for cluster in clusters_to_hibernate if cluster.hcp == 'false' and cluster.type != 'ocp' and cluster.name not in DO_NOT_HIBERNATE_LIST])
+
+    results = run_for_clusters(lambda cluster: hibernate_weekend_cluster(cluster, inventory, failed_regions, classic_failures), clusters_to_hibernate)
     hibernated_clusters = []
-    for cluster in clusters_to_hibernate:
-        print('starting with', cluster.name, cluster.type)
-        outcome = True
-        if cluster.name in DO_NOT_HIBERNATE_LIST:
-            print(f'skipping the cluster {cluster.name}')
+    # instances stopped per cluster, confirmed together once every cluster was handled
+    watches = {}
+    for cluster, (result, error) in zip(clusters_to_hibernate, results):
+        if error is not None:
+            # some of its instances may be stopped already, keeping it lets the resume job bring them back
+            cluster.hibernate_error = str(error)
+            hibernated_clusters.append(cluster.__dict__)
             continue
-        elif cluster.hcp == "false":
-            if cluster.type == 'ocp':
-                hibernate_ipi_cluster(cluster, ec2_instances[cluster.region])
-                print('hibernating IPI cluster - ', cluster.name)
-            else:
-                hibernate_cluster(cluster)
-                print("OSD or ROSA Classic - ", cluster.name)
-        else:
-            outcome = hybernate_hypershift_cluster(cluster, ec2_instances[cluster.region])
-            print("Hypershift cluster - ", cluster.name)
+        outcome, watches[cluster.id] = result
         if outcome:
             hibernated_clusters.append(cluster.__dict__)
-        print(f'Hibernated {cluster.name}')
+    not_stopped = get_unsettled_instances(watches, 'stopped')
+    for cluster in clusters_to_hibernate:
+        if cluster.id in not_stopped:
+            cluster.hibernate_error = f'worker nodes did not stop: {not_stopped[cluster.id]}'
+            print(f'Worker nodes of cluster {cluster.name} did not stop', not_stopped[cluster.id])
     hibernated_json = json.dumps(hibernated_clusters, indent=4)
     # print(hibernated_json)
     open('hibernated_latest.json', 'w').write(hibernated_json)
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     try:
         s3.upload_file('hibernated_latest.json', 'rhods-devops', 'Cloud-Cost-Optimization/Weekend-Hibernation/hibernated_latest.json')
     except Exception as e:
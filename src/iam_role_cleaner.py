@@ -13,7 +13,7 @@ import argparse
 import json
 import sys
 from datetime import datetime, timedelta
-import boto3
+from aws_clients import get_client
 from botocore.exceptions import ClientError, NoCredentialsError
 
 
@@ -21,8 +21,7 @@ class IAMRoleCleaner:
     def __init__(self, region_name="us-east-1", dry_run=True):
         self.dry_run = dry_run
         try:
-            self.session = boto3.Session(region_name=region_name)
-            self.iam_client = self.session.client("iam")
+            self.iam_client = get_client("iam", region_name=region_name)
             print(f"Initialized IAM client for region: {region_name}")
         except NoCredentialsError:
             print("Error: AWS credentials not found. Please configure AWS credentials.")
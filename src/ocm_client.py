@@ -0,0 +1,278 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cluster_executor import CLUSTER_MAX_WORKERS_PER_ACCOUNT, run_for_clusters
+from cluster_table import CLUSTER_TABLE_SYNC_OVERLAP, cluster_table
+from creator_cache import creator_cache
+from ocm_token import get_service_account_token_manager, get_token_manager, ocm_token_manager
+
+OCM_API_URLS = {'PROD': 'https://api.openshift.com/api', 'STAGE': 'https://api.stage.openshift.com/api'}
+# points every account at another API server, e.g. the local stand-in of ocm_stand_in.py
+OCM_API_URL = os.environ.get('OCM_API_URL')
+# accounts processed by the jobs, each one gets its own client and session
+OCM_ACCOUNTS = os.environ.get('OCM_ACCOUNTS', 'PROD,STAGE').split(',')
+CLUSTERS_PATH = '/clusters_mgmt/v1/clusters'
+AWS_CLUSTERS_SEARCH = "cloud_provider.id='aws'"
+SUBSCRIPTIONS_PATH = '/accounts_mgmt/v1/subscriptions'
+ACCOUNTS_PATH = '/accounts_mgmt/v1/accounts'
+# subscription statuses of the clusters which are gone from clusters_mgmt
+DELETED_SUBSCRIPTION_STATUSES = "('Deprovisioned', 'Archived')"
+
+# items per page of the list calls
+OCM_PAGE_SIZE = int(os.environ.get('OCM_PAGE_SIZE', 100))
+# connections kept alive per account, one session is shared by every thread talking to that account
+OCM_MAX_CONNECTIONS = int(os.environ.get('OCM_MAX_CONNECTIONS', 16))
+OCM_TIMEOUT = int(os.environ.get('OCM_TIMEOUT', 60))
+# IDs per "in (...)" search, keeps the query string well under the URL length limits
+OCM_SEARCH_BATCH = int(os.environ.get('OCM_SEARCH_BATCH', 50))
+# hibernate/resume requests in flight at the same time
+OCM_MAX_ACTION_WORKERS = int(os.environ.get('OCM_MAX_ACTION_WORKERS', 8))
+# node pool reconciliation is polled every NODE_POOL_POLL_START seconds at first, backing off up to NODE_POOL_POLL_MAX
+NODE_POOL_POLL_START = int(os.environ.get('NODE_POOL_POLL_START', 5))
+NODE_POOL_POLL_MAX = int(os.environ.get('NODE_POOL_POLL_MAX', 60))
+NODE_POOL_SYNC_TIMEOUT = int(os.environ.get('NODE_POOL_SYNC_TIMEOUT', 900))
+# full: list every cluster on each run, incremental: only fetch the changes since the last run into the persisted cluster table
+OCM_SYNC_MODE = os.environ.get('OCM_SYNC_MODE', 'full')
+
+_lock = threading.Lock()
+_clients = {}
+
+
+class ocm_client:
+    """clusters_mgmt REST client of an OCM account over a pooled HTTP session.
+    Requests run with token_manager, the creator lookups with accounts_token_manager when given"""
+    def __init__(self, ocm_account:str, token_manager:ocm_token_manager, base_url:str=None, accounts_token_manager:ocm_token_manager=None):
+        self.ocm_account = ocm_account
+        self.base_url = base_url or OCM_API_URL or OCM_API_URLS[ocm_account]
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OCM_MAX_CONNECTIONS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.token_manager = token_manager
+        self.accounts_token_manager = accounts_token_manager or token_manager
+        # cluster ID -> console URL
+        self.console_urls = {}
+
+    def request(self, method:str, path:str, token_manager:ocm_token_manager=None, **kwargs):
+        """Authenticated request, a 401 is retried once with a freshly exchanged token"""
+        token_manager = token_manager or self.token_manager
+        for force_refresh in (False, True):
+            headers = {'Authorization': f'Bearer {token_manager.get_token(force_refresh)}'}
+            response = self.session.request(method, f'{self.base_url}{path}', headers=headers, timeout=OCM_TIMEOUT, **kwargs)
+            if response.status_code != 401:
+                break
+        response.raise_for_status()
+        return response
+
+    def get(self, path:str, token_manager:ocm_token_manager=None, **params):
+        return self.request('GET', path, token_manager, params=params).json()
+
+    def list(self, path:str, search:str=None, size:int=OCM_PAGE_SIZE, token_manager:ocm_token_manager=None):
+        """Yield the items of a paginated collection, page by page until the collection is exhausted"""
+        page = 1
+        while True:
+            params = {'page': page, 'size': size}
+            if search:
+                params['search'] = search
+            body = self.get(path, token_manager, **params)
+            items = body.get('items', [])
+            yield from items
+            if len(items) < size or page * size >= body.get('total', page * size + 1):
+                break
+            page += 1
+
+    def list_clusters(self, search:str=AWS_CLUSTERS_SEARCH):
+        """Cluster records matching the search, by default every AWS cluster of the account"""
+        if OCM_SYNC_MODE == 'incremental':
+            return self.sync_clusters(search)
+        return list(self.list(CLUSTERS_PATH, search))
+
+    def sync_clusters(self, search:str=AWS_CLUSTERS_SEARCH):
+        """Cluster records matching the search from the persisted cluster table, updated with the clusters changed since the last sync
+        and cleared of the deprovisioned ones. The table is listed again from scratch when it is missing or its last full sync is too old"""
+        table = cluster_table(self.ocm_account, search)
+        table.load()
+        started_at = time.time()
+        if table.needs_full_sync():
+            table.clusters = {cluster['id']: cluster for cluster in self.list(CLUSTERS_PATH, search)}
+            table.full_synced_at = started_at
+            print(f'listed all the {len(table.clusters)} clusters of {self.ocm_account}')
+        else:
+            since = datetime.fromtimestamp(table.synced_at - CLUSTER_TABLE_SYNC_OVERLAP, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            updated = list(self.list(CLUSTERS_PATH, f"({search}) and updated_timestamp >= '{since}'"))
+            table.clusters.update({cluster['id']: cluster for cluster in updated})
+            deleted_search = f"status in {DELETED_SUBSCRIPTION_STATUSES} and updated_at >= '{since}'"
+            deleted = [subscription.get('cluster_id') for subscription in self.list(SUBSCRIPTIONS_PATH, deleted_search)]
+            deleted = [table.clusters.pop(cluster_id) for cluster_id in deleted if cluster_id in table.clusters]
+            print(f'synced {len(updated)} updated and {len(deleted)} deleted clusters of {self.ocm_account} since {since}')
+        table.synced_at = started_at
+        table.save()
+        return list(table.clusters.values())
+
+    def get_console_url(self, cluster_detail:dict):
+        """Console URL of a listed cluster, only fetched when the list record lacks it and cached per cluster ID"""
+        cluster_id = cluster_detail['id']
+        if cluster_id not in self.console_urls:
+            url = cluster_detail.get('console', {}).get('url')
+            if not url:
+                url = self.get(f'{CLUSTERS_PATH}/{cluster_id}').get('console', {}).get('url', '')
+            self.console_urls[cluster_id] = url
+        return self.console_urls[cluster_id]
+
+    def hibernate_cluster(self, cluster_id:str):
+        self.request('POST', f'{CLUSTERS_PATH}/{cluster_id}/hibernate')
+
+    def resume_cluster(self, cluster_id:str):
+        self.request('POST', f'{CLUSTERS_PATH}/{cluster_id}/resume')
+
+    def list_node_pools(self, cluster_id:str):
+        return [node_pool for node_pool in self.list(f'{CLUSTERS_PATH}/{cluster_id}/node_pools') if node_pool['kind'] == 'NodePool']
+
+    def patch_node_pool(self, cluster_id:str, node_pool_id:str, replicas:int):
+        payload = {'id': node_pool_id, 'labels': {}, 'taints': [], 'replicas': replicas}
+        self.request('PATCH', f'{CLUSTERS_PATH}/{cluster_id}/node_pools/{node_pool_id}', json=payload)
+
+    def sync_node_pools(self, cluster_id:str):
+        """Nudge every node pool of the HCP cluster one replica away and back, all the pools at the same time,
+        so the hosted control plane reconciles the workers. Returns the number of replicas of the pools which were synced"""
+        def sync_node_pool(node_pool):
+            replicas = node_pool['replicas']
+            new_replicas = replicas + 1 if replicas <= 2 else replicas - 1
+            try:
+                self.patch_node_pool(cluster_id, node_pool['id'], new_replicas)
+                print(f'synced the machine pool {node_pool["id"]} with the new replica count {new_replicas} for cluster {cluster_id}')
+            except Exception as e:
+                print(f'could not sync the machine pool {node_pool["id"]} of cluster {cluster_id}: {e}')
+                return 0
+            # instantly resetting the node count to avoid additional cost
+            try:
+                self.patch_node_pool(cluster_id, node_pool['id'], replicas)
+                print(f'reset the machine pool {node_pool["id"]} with the original replica count {replicas} for cluster {cluster_id}')
+                return replicas
+            except Exception as e:
+                print(f'could not reset the machine pool {node_pool["id"]} of cluster {cluster_id}: {e}')
+                return new_replicas
+
+        node_pools = self.list_node_pools(cluster_id)
+        if not node_pools:
+            return 0
+        with ThreadPoolExecutor(max_workers=len(node_pools)) as executor:
+            return sum(executor.map(sync_node_pool, node_pools))
+
+    def wait_for_node_pools(self, cluster_id:str, timeout:int=NODE_POOL_SYNC_TIMEOUT):
+        """Poll the node pools of the HCP cluster with backoff until each one reports current_replicas equal to its replicas.
+        Returns False when they did not reconcile within the timeout"""
+        deadline = time.monotonic() + timeout
+        delay = NODE_POOL_POLL_START
+        while True:
+            pending = [node_pool['id'] for node_pool in self.list_node_pools(cluster_id)
+                       if node_pool.get('status', {}).get('current_replicas') != node_pool['replicas']]
+            if not pending:
+                print(f'node pools of cluster {cluster_id} reconciled')
+                return True
+            if time.monotonic() + delay > deadline:
+                print(f'node pools {pending} of cluster {cluster_id} did not reconcile within {timeout}s')
+                return False
+            print(f'waiting {delay}s for the node pools {pending} of cluster {cluster_id} to reconcile')
+            time.sleep(delay)
+            delay = min(delay * 2, NODE_POOL_POLL_MAX)
+
+    def search_by_ids(self, path:str, field:str, ids:list, token_manager:ocm_token_manager=None):
+        """Yield the items whose field is one of the given IDs, with one paginated search per batch of IDs"""
+        ids = list(ids)
+        for start in range(0, len(ids), OCM_SEARCH_BATCH):
+            batch = ', '.join(f"'{value}'" for value in ids[start:start + OCM_SEARCH_BATCH])
+            yield from self.list(path, f'{field} in ({batch})', token_manager=token_manager)
+
+    def get_cluster_creators(self, cluster_ids:list, cache:creator_cache=None):
+        """creation_date, creator_name and creator_email keyed by cluster ID.
+        Creators are looked up in the cache first, every unique creator missing there is resolved once and cached"""
+        cache = cache or creator_cache()
+        subscriptions = {}
+        for subscription in self.search_by_ids(SUBSCRIPTIONS_PATH, 'cluster_id', cluster_ids, self.accounts_token_manager):
+            subscriptions.setdefault(subscription['cluster_id'], subscription)
+        creator_ids = {subscription['creator']['id'] for subscription in subscriptions.values() if subscription.get('creator', {}).get('id')}
+        creators = {creator_id: cache.get(self.ocm_account, creator_id) for creator_id in creator_ids}
+        unresolved = sorted(creator_id for creator_id, creator in creators.items() if creator is None)
+        accounts = {account['id']: account for account in self.search_by_ids(ACCOUNTS_PATH, 'id', unresolved, self.accounts_token_manager)}
+        for creator_id in unresolved:
+            creators[creator_id] = cache.put(self.ocm_account, creator_id, accounts.get(creator_id))
+        print(f'resolved {len(unresolved)} of {len(creator_ids)} creators from {self.ocm_account}')
+        details = {}
+        for cluster_id, subscription in subscriptions.items():
+            creator = creators.get(subscription.get('creator', {}).get('id'), {})
+            details[cluster_id] = {'creation_date': subscription.get('created_at', ''),
+                                   'creator_name': creator.get('name', ''),
+                                   'creator_email': creator.get('email', '')}
+        return details
+
+def get_ocm_client(ocm_account:str):
+    """Client of the given account, created on first use and shared by every caller of the process"""
+    with _lock:
+        if ocm_account not in _clients:
+            _clients[ocm_account] = ocm_client(ocm_account, get_token_manager(), accounts_token_manager=get_service_account_token_manager())
+        return _clients[ocm_account]
+
+
+def for_each_account(task, ocm_accounts:list=OCM_ACCOUNTS):
+    """Run task(ocm_account) for all the accounts in parallel, returns {ocm_account: result} in the order of the accounts.
+    An exception raised for an account is raised again once all the accounts are done"""
+    with ThreadPoolExecutor(max_workers=max(len(ocm_accounts), 1)) as executor:
+        futures = {ocm_account: executor.submit(task, ocm_account) for ocm_account in ocm_accounts}
+    return {ocm_account: future.result() for ocm_account, future in futures.items()}
+
+
+def get_clusters_for_accounts(get_all_cluster_details, clusters:list, ocm_accounts:list=OCM_ACCOUNTS):
+    """Run get_all_cluster_details(ocm_account, account_clusters) for all the accounts in parallel,
+    each account filling its own list, and append the lists to clusters in the order of the accounts"""
+    def get_account_clusters(ocm_account):
+        account_clusters = []
+        get_all_cluster_details(ocm_account, account_clusters)
+        return account_clusters
+
+    for account_clusters in for_each_account(get_account_clusters, ocm_accounts).values():
+        clusters.extend(account_clusters)
+
+
+def update_cluster_details(clusters:list):
+    """Set creation_date, creator_name and creator_email of the clusters, resolving the creators of all the accounts in parallel"""
+    cache = creator_cache()
+    cache.load()
+
+    def update_account_cluster_details(ocm_account):
+        account_clusters = [cluster for cluster in clusters if cluster.ocm_account == ocm_account]
+        creators = get_ocm_client(ocm_account).get_cluster_creators([cluster.id for cluster in account_clusters], cache)
+        for cluster in account_clusters:
+            details = creators.get(cluster.id)
+            if not details:
+                print(f'could not find the subscription of cluster {cluster.name}')
+                continue
+            cluster.creation_date = details['creation_date']
+            cluster.creator_name = details['creator_name']
+            if details['creator_email']:
+                cluster.creator_email = details['creator_email']
+
+    for_each_account(update_account_cluster_details, sorted({cluster.ocm_account for cluster in clusters}))
+    cache.save()
+
+
+def run_cluster_actions(action:str, clusters:list, max_workers:int=OCM_MAX_ACTION_WORKERS):
+    """Request the hibernate or resume action for all the clusters in parallel, at most max_workers at a time and at most
+    CLUSTER_MAX_WORKERS_PER_ACCOUNT per OCM account. Returns {cluster ID: error} for the clusters whose request failed,
+    a failure does not stop the others"""
+    def run_cluster_action(cluster):
+        get_ocm_client(cluster.ocm_account).request('POST', f'{CLUSTERS_PATH}/{cluster.id}/{action}')
+        print(f'requested {action} of cluster {cluster.name}')
+
+    if not clusters:
+        return {}
+    # the requests only go to OCM, the region of the cluster does not matter
+    results = run_for_clusters(run_cluster_action, clusters, max_workers=max_workers, max_per_region=max_workers,
+                               max_per_account=CLUSTER_MAX_WORKERS_PER_ACCOUNT)
+    return {cluster.id: error for cluster, (_, error) in zip(clusters, results) if error is not None}
@@ -0,0 +1,197 @@
+"""
+Local OCM API stand-in
+
+Serves the clusters_mgmt and accounts_mgmt endpoints used by the scripts, plus an SSO token endpoint, from a generated
+or fixture fleet, so cluster listing and enrichment can be exercised and timed offline.
+
+Point the scripts at it with:
+OCM_API_URL=http://localhost:8000/api OCM_TOKEN_URL=http://localhost:8000/token OCM_TOKEN=offline python src/cluster_aggregator.py
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+REGIONS = ['us-east-1', 'us-east-2', 'us-west-2', 'eu-west-1', 'ap-south-1']
+# product, hypershift enabled
+CLUSTER_TYPES = [('osd', False), ('rosa', False), ('rosa', True), ('ocp', False)]
+SEARCH_TERM = re.compile(r"^\(?\s*([\w.]+)\s*(=|>=|<=|in)\s*(.+?)\s*\)?$")
+
+
+def generate_fleet(cluster_count:int, creator_count:int=20):
+    """Clusters, subscriptions and accounts of a fleet of the given size, the same size always gives the same fleet"""
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    accounts = [{'id': f'account{index:05d}', 'first_name': 'User', 'last_name': str(index),
+                 'email': f'user{index}+ocm@redhat.com'} for index in range(creator_count)]
+    clusters = []
+    subscriptions = []
+    for index in range(cluster_count):
+        product, hypershift = CLUSTER_TYPES[index % len(CLUSTER_TYPES)]
+        cluster_id = f'{index:032x}'
+        name = f'ipi-{index}-a-b-c' if product == 'ocp' else f'cluster-{index}'
+        timestamp = (start + timedelta(minutes=index)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        clusters.append({'kind': 'Cluster', 'id': cluster_id, 'name': name,
+                         'api': {'url': f'https://api.{name}.example.com:6443'},
+                         'console': {'url': f'https://console-openshift-console.apps.ipi{index}.ocp2.odhdev.com' if product == 'ocp' else f'https://console-openshift-console.apps.{name}.example.com'},
+                         'openshift_version': '4.15.0', 'product': {'id': product}, 'hypershift': {'enabled': hypershift},
+                         'cloud_provider': {'id': 'aws'}, 'region': {'id': REGIONS[index % len(REGIONS)]},
+                         'state': 'ready', 'creation_timestamp': timestamp, 'updated_timestamp': timestamp})
+        subscriptions.append({'id': f'subscription{index:07d}', 'cluster_id': cluster_id, 'status': 'Active',
+                              'created_at': timestamp, 'updated_at': timestamp,
+                              'creator': {'id': accounts[index % creator_count]['id']}})
+    return {'clusters': clusters, 'subscriptions': subscriptions, 'accounts': accounts}
+
+
+def get_field(item:dict, field:str):
+    for key in field.split('.'):
+        item = item.get(key) if isinstance(item, dict) else None
+    return item
+
+
+def parse_search(search:str):
+    """Parse the subset of the OCM search language the scripts use into (field, operator, value) terms: terms joined by 'and',
+    each one being field = 'value', field >= 'value', field <= 'value' or field in ('value', ...)"""
+    terms = []
+    for term in re.split(r'\s+and\s+', search.strip()) if search else []:
+        result = SEARCH_TERM.match(term.strip())
+        if not result:
+            raise ValueError(f'unsupported search term {term}')
+        field, operator, value = result.groups()
+        terms.append((field, operator, set(re.findall(r"'([^']*)'", value)) if operator == 'in' else value.strip("'")))
+    return terms
+
+
+def matches(item:dict, terms:list):
+    for field, operator, value in terms:
+        actual = get_field(item, field)
+        if operator == 'in':
+            if actual not in value:
+                return False
+            continue
+        actual = '' if actual is None else str(actual)
+        if (operator == '=' and actual != value) or (operator == '>=' and actual < value) or (operator == '<=' and actual > value):
+            return False
+    return True
+
+
+class ocm_stand_in(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, fleet:dict, latency:float=0.0):
+        super().__init__(address, ocm_request_handler)
+        self.fleet = fleet
+        self.clusters = {cluster['id']: cluster for cluster in fleet['clusters']}
+        self.node_pools = {cluster['id']: [{'kind': 'NodePool', 'id': 'workers', 'replicas': 2, 'status': {'current_replicas': 2}}]
+                           for cluster in fleet['clusters'] if cluster['hypershift']['enabled']}
+        # seconds added to every response
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class ocm_request_handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status:int, body:dict=None):
+        payload = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def reply_page(self, items:list, query:dict):
+        try:
+            terms = parse_search(query.get('search', [''])[0])
+        except ValueError as e:
+            return self.reply(400, {'kind': 'Error', 'reason': str(e)})
+        items = [item for item in items if matches(item, terms)]
+        page = int(query.get('page', ['1'])[0])
+        size = int(query.get('size', ['100'])[0])
+        page_items = items[(page - 1) * size:page * size]
+        self.reply(200, {'kind': 'List', 'page': page, 'size': len(page_items), 'total': len(items), 'items': page_items})
+
+    def handle_request(self, method:str):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/').split('/')
+        if method == 'POST' and url.path == '/token':
+            return self.reply(200, {'access_token': 'stand-in', 'expires_in': 900, 'token_type': 'Bearer'})
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self.reply(401, {'kind': 'Error', 'reason': 'missing bearer token'})
+        if path[:4] == ['', 'api', 'clusters_mgmt', 'v1'] and len(path) > 4 and path[4] == 'clusters':
+            if len(path) == 5 and method == 'GET':
+                return self.reply_page(server.fleet['clusters'], query)
+            cluster = server.clusters.get(path[5])
+            if cluster is None:
+                return self.reply(404, {'kind': 'Error', 'reason': f'cluster {path[5]} not found'})
+            if len(path) == 6 and method == 'GET':
+                return self.reply(200, cluster)
+            if len(path) == 7 and path[6] in ('hibernate', 'resume') and method == 'POST':
+                cluster['state'] = 'hibernating' if path[6] == 'hibernate' else 'resuming'
+                cluster['updated_timestamp'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+                return self.reply(200)
+            if len(path) >= 7 and path[6] == 'node_pools':
+                node_pools = server.node_pools.get(cluster['id'], [])
+                if len(path) == 7 and method == 'GET':
+                    return self.reply_page(node_pools, query)
+                if len(path) == 8 and method == 'PATCH':
+                    patch = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    for node_pool in node_pools:
+                        if node_pool['id'] == path[7]:
+                            node_pool['replicas'] = patch.get('replicas', node_pool['replicas'])
+                            node_pool['status']['current_replicas'] = node_pool['replicas']
+                            return self.reply(200, node_pool)
+                    return self.reply(404, {'kind': 'Error', 'reason': f'node pool {path[7]} not found'})
+        if path[:4] == ['', 'api', 'accounts_mgmt', 'v1'] and len(path) == 5 and method == 'GET':
+            if path[4] in ('subscriptions', 'accounts'):
+                return self.reply_page(server.fleet[path[4]], query)
+        self.reply(404, {'kind': 'Error', 'reason': f'{method} {url.path} is not served by the stand-in'})
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+
+def start_stand_in(fleet:dict, latency:float=0.0, port:int=0):
+    """Serve the fleet on a background thread, returns the server, its base URL is http://localhost:<server.server_port>"""
+    server = ocm_stand_in(('localhost', port), fleet, latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Local stand-in of the OCM clusters_mgmt and accounts_mgmt APIs')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--clusters', type=int, default=500, help='size of the generated fleet')
+    parser.add_argument('--creators', type=int, default=20, help='number of distinct cluster creators')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--fixture', help='JSON file with clusters, subscriptions and accounts to serve instead of a generated fleet')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    fleet = json.load(open(args.fixture)) if args.fixture else generate_fleet(args.clusters, args.creators)
+    server = ocm_stand_in(('localhost', args.port), fleet, args.latency)
+    print(f'serving {len(fleet["clusters"])} clusters on http://localhost:{args.port}/api with {args.latency}s latency')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+
+import requests
+
+OCM_TOKEN_URL = os.environ.get('OCM_TOKEN_URL', 'https://sso.redhat.com/auth/realms/redhat-external/protocol/openid-connect/token')
+# client the offline tokens of console.redhat.com are issued to
+OCM_OFFLINE_TOKEN_CLIENT_ID = 'cloud-services'
+# access tokens are refreshed this many seconds before they expire, so a request never goes out with a token about to lapse
+OCM_TOKEN_REFRESH_MARGIN = int(os.environ.get('OCM_TOKEN_REFRESH_MARGIN', 60))
+OCM_TIMEOUT = int(os.environ.get('OCM_TIMEOUT', 60))
+
+_lock = threading.Lock()
+_token_managers = {}
+
+
+class ocm_token_manager:
+    """Access token of the SSO exchange for the OCM API, kept in memory and refreshed when it is about to expire.
+    Exchanges the service account client credentials when given, the offline token otherwise"""
+    def __init__(self, client_id:str=None, client_secret:str=None, offline_token:str=None, token_url:str=OCM_TOKEN_URL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.offline_token = offline_token
+        self.token_url = token_url
+        self.access_token = None
+        self.expires_at = 0
+        self.lock = threading.Lock()
+
+    def grant(self):
+        if self.client_id and self.client_secret:
+            return {'grant_type': 'client_credentials', 'client_id': self.client_id, 'client_secret': self.client_secret}
+        if self.offline_token:
+            return {'grant_type': 'refresh_token', 'client_id': OCM_OFFLINE_TOKEN_CLIENT_ID, 'refresh_token': self.offline_token}
+        raise ValueError('no OCM credentials, set OCM_CLIENT_ID and OCM_CLIENT_SECRET or OCM_TOKEN')
+
+    def refresh(self):
+        requested_at = time.time()
+        response = requests.post(self.token_url, data=self.grant(), timeout=OCM_TIMEOUT)
+        response.raise_for_status()
+        token = response.json()
+        self.access_token = token['access_token']
+        self.expires_at = requested_at + token.get('expires_in', 300)
+        print(f'refreshed the OCM access token, valid for {int(self.expires_at - requested_at)}s')
+
+    def get_token(self, force_refresh:bool=False):
+        """Current access token, exchanged again when forced or when it expires within the refresh margin"""
+        with self.lock:
+            if force_refresh or self.access_token is None or time.time() >= self.expires_at - OCM_TOKEN_REFRESH_MARGIN:
+                self.refresh()
+            return self.access_token
+
+
+def get_token_manager():
+    """Token manager of the OCM_TOKEN user, the clusters_mgmt calls (listing, hibernate/resume, node pools) run as that user"""
+    with _lock:
+        if 'user' not in _token_managers:
+            _token_managers['user'] = ocm_token_manager(offline_token=os.environ.get('OCM_TOKEN'))
+        return _token_managers['user']
+
+
+def get_service_account_token_manager():
+    """Token manager of the OCM_CLIENT_ID/OCM_CLIENT_SECRET service account, used for the accounts_mgmt creator lookups.
+    Falls back to the OCM_TOKEN user when no service account is configured"""
+    if not (os.environ.get('OCM_CLIENT_ID') and os.environ.get('OCM_CLIENT_SECRET')):
+        return get_token_manager()
+    with _lock:
+        if 'service_account' not in _token_managers:
+            _token_managers['service_account'] = ocm_token_manager(os.environ.get('OCM_CLIENT_ID'), os.environ.get('OCM_CLIENT_SECRET'))
+        return _token_managers['service_account']
@@ -1,8 +1,12 @@
 import json
 import time
 
-import boto3
-import os
+from aws_clients import get_client
+from cluster_executor import run_for_clusters
+from ec2_inventory import get_cluster_regions, get_inventory, region_inventory
+from ec2_actions import start_instances
+from ec2_waiter import get_unsettled_instances
+from ocm_client import get_ocm_client, run_cluster_actions
 
 # need to sync the list with latest status, and resume it only if status is Hibernating
 
@@ -20,35 +24,16 @@ class oc_cluster:
         self.status = cluster_detail['status']
         self.resume_error = ''
         self.ocm_account = cluster_detail['ocm_account']
-def run_command(command):
-    print(command)
-    output = os.popen(command).read()
-    # print(output)
-    return output
 
 def get_last_hibernated():
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     s3.download_file('rhods-devops', 'Cloud-Cost-Optimization/Weekend-Hibernation/hibernated_latest.json', 'hibernated_latest.json')
 
-def worker_node_belongs_to_the_hcp_cluster(ec2_instance:dict, cluster_name:str):
-    """Check if an EC2 instance belongs to a specific HCP cluster """
-    result = False
-    for tag in ec2_instance['Tags']:
-        if tag['Key'] == 'api.openshift.com/name' and tag['Value'] == cluster_name:
-            result = True
-            break
-    return result
-
-def resume_hypershift_cluster(cluster:oc_cluster, ec2_map:dict):
-    # ec2_map = ec2_instances[cluster.region]
-
-    # print([name for name in ec2_map])
-    worker_nodes = [ec2_name for ec2_name in ec2_map]
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    InstanceIds = [ec2_map[worker_node]['InstanceId'] for worker_node in worker_nodes if worker_node_belongs_to_the_hcp_cluster(ec2_map[worker_node], cluster.name)]
+def resume_hypershift_cluster(cluster:oc_cluster, inventory:region_inventory):
+    ec2_client = get_client('ec2', region_name=cluster.region)
+    InstanceIds = [instance.id for instance in inventory.hcp_workers(cluster.name, 'stopped')]
     if len(InstanceIds) > 0:
         print(f'Starting Worker Instances of cluster {cluster.name}', InstanceIds)
-        worker_count = len(InstanceIds)
         ec2_client.terminate_instances(InstanceIds=InstanceIds)
         print(f'Done resuming the cluster {cluster.name}')
         time.sleep(5)
@@ -56,78 +41,65 @@ def resume_hypershift_cluster(cluster:oc_cluster, ec2_map:dict):
         print(f'Cluster {cluster.name} is already running.')
 
 
-
-
 def hibernate_cluster(cluster: oc_cluster):
-    run_command(f'script/./hybernate_cluster.sh {cluster.ocm_account} {cluster.id}')
+    get_ocm_client(cluster.ocm_account).hibernate_cluster(cluster.id)
 
 def resume_cluster(cluster: oc_cluster):
-    run_command(f'script/./resume_cluster.sh {cluster.ocm_account} {cluster.id}')
-
-def get_instances_for_region(region, current_state):
-    ec2_client = boto3.client('ec2', region_name=region)
-    filters = [{'Name': 'instance-state-name', 'Values': [current_state]}]
-    ec2_map = ec2_client.describe_instances(Filters=filters, MaxResults=1000)
-    ec2_map = [ec2 for ec2 in ec2_map['Reservations']]
-    ec2_map = [instance for ec2 in ec2_map for instance in ec2['Instances']]
-    ec2_map = {list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))[0]['Value']: instance for instance in
-               ec2_map if list(filter(lambda obj: obj['Key'] == 'Name', instance['Tags']))}
-    print(region, len(ec2_map))
-    return ec2_map
+    get_ocm_client(cluster.ocm_account).resume_cluster(cluster.id)
 
-def get_all_instances(ec2_instances, current_state):
-    client = boto3.client('ec2', region_name='us-east-1')
-    regions = [region['RegionName'] for region in client.describe_regions()['Regions']]
-    for region in regions:
-        ec2_instances[region] = get_instances_for_region(region, current_state)
-
-def worker_node_belongs_to_the_ipi_cluster(ec2_instance:dict, cluster_name:str):
-    tags = {tag['Key']:tag['Value'] for tag in ec2_instance['Tags']}
-    result = 'red-hat-clustertype' not in tags and 'api.openshift.com/name' not in tags
-    for key, value in tags.items():
-        if key.startswith(f'kubernetes.io/cluster/{cluster_name}-') and value == 'owned':
-            result = result and True
-            break
-    return result
-
-def resume_ipi_cluster(cluster:oc_cluster, ec2_map:dict):
-    # print([name for name in ec2_map])
-    worker_nodes = [ec2_name for ec2_name in ec2_map if ec2_name.startswith(f'{cluster.internal_name}-')]
-    ec2_client = boto3.client('ec2', region_name=cluster.region)
-    InstanceIds = [ec2_map[worker_node]['InstanceId'] for worker_node in worker_nodes if worker_node_belongs_to_the_ipi_cluster(ec2_map[worker_node], cluster.internal_name)]
+def resume_ipi_cluster(cluster:oc_cluster, inventory:region_inventory):
+    result = None
+    InstanceIds = [instance.id for instance in inventory.ipi_nodes(cluster.internal_name, 'stopped')]
     if len(InstanceIds) > 0:
         print(f'Starting Worker Instances of cluster {cluster.name}', InstanceIds)
-        worker_count = len(InstanceIds)
-        ec2_client.start_instances(InstanceIds=InstanceIds)
+        result = start_instances(cluster.region, InstanceIds)
         print(f'Done resuming the cluster {cluster.name}')
     else:
         print(f'Cluster {cluster.name} is already running.')
+    return result
+
+def resume_weekend_cluster(cluster:oc_cluster, inventory:dict, failed_regions:dict, classic_failures:dict):
+    """Resume one cluster, returns the future of the IPI instances started for it"""
+    print('starting with', cluster.name, cluster.type)
+    starting = None
+    if cluster.region in failed_regions and (cluster.hcp == "true" or cluster.type == 'ocp'):
+        print(f'Skipping {cluster.name}, could not list the instances in region {cluster.region}')
+        return starting
+    if cluster.hcp == "false":
+        if cluster.type == 'ocp':
+            starting = resume_ipi_cluster(cluster, inventory[cluster.region])
+            print("IPI - ", cluster.name)
+        else:
+            if cluster.id in classic_failures:
+                return starting
+            print("OSD or ROSA Classic - ", cluster.name)
+    else:
+        resume_hypershift_cluster(cluster, inventory[cluster.region])
+        print("Hypershift cluster - ", cluster.name)
+    print(f'Hibernated {cluster.name}')
+    return starting
 
 def main():
-    ec2_instances = {}
-    get_all_instances(ec2_instances, 'stopped')
     get_last_hibernated()
     clusters_to_resume = []
     clusters = json.load(open('hibernated_latest.json'))
     for cluster in clusters:
         clusters_to_resume.append(oc_cluster(cluster))
-    resumed_clusters = []
+    inventory = {}
+    failed_regions = get_inventory(inventory, ['stopped'], get_cluster_regions(clusters_to_resume))
+    classic_failures = run_cluster_actions('resume', [cluster for cluster in clusters_to_resume if cluster.hcp == 'false' and cluster.type != 'ocp'])
+    results = run_for_clusters(lambda cluster: resume_weekend_cluster(cluster, inventory, failed_regions, classic_failures), clusters_to_resume)
+    # instances started per IPI cluster, confirmed together once every cluster was handled
+    watches = {}
+    for cluster, (starting, error) in zip(clusters_to_resume, results):
+        if error is not None:
+            cluster.resume_error = str(error)
+            continue
+        watches[cluster.id] = starting
+    not_started = get_unsettled_instances(watches, 'running')
     for cluster in clusters_to_resume:
-        print('starting with', cluster.name, cluster.type)
-        if cluster.hcp == "false":
-            if cluster.type == 'ocp':
-                resume_ipi_cluster(cluster, ec2_instances[cluster.region])
-                print("IPI - ", cluster.name)
-            else:
-                resume_cluster(cluster)
-                print("OSD or ROSA Classic - ", cluster.name)
-        else:
-            resume_hypershift_cluster(cluster, ec2_instances[cluster.region])
-            print("Hypershift cluster - ", cluster.name)
-        resumed_clusters.append(cluster.__dict__)
-        print(f'Hibernated {cluster.name}')
-
-    # print(json.dumps(resumed_clusters, indent=4))
+        if cluster.id in not_started:
+            print(f'Worker nodes of cluster {cluster.name} did not start', not_started[cluster.id])
 
 
 if __name__ == '__main__':
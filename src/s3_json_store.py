@@ -0,0 +1,36 @@
+import json
+import os
+
+from aws_clients import get_client
+
+# the jobs run on ephemeral runners, their state is shared between them through the same bucket as the hibernation state
+S3_STORE_BUCKET = 'rhods-devops'
+
+
+class s3_json_store:
+    """JSON document kept in the bucket under key, with a local copy at path"""
+    def __init__(self, key:str, path:str, description:str):
+        self.key = key
+        self.path = path
+        self.description = description
+
+    def load(self):
+        """The stored document, the local copy when the download fails, None when neither is readable"""
+        try:
+            get_client('s3').download_file(S3_STORE_BUCKET, self.key, self.path)
+        except Exception as e:
+            print(f'could not download the {self.description}: {e}')
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            return json.load(open(self.path))
+        except ValueError as e:
+            print(f'ignoring the unreadable {self.description} {self.path}: {e}')
+            return None
+
+    def save(self, document, indent:int=None):
+        open(self.path, 'w').write(json.dumps(document, indent=indent))
+        try:
+            get_client('s3').upload_file(self.path, S3_STORE_BUCKET, self.key)
+        except Exception as e:
+            print(f'could not upload the {self.description}: {e}')